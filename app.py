@@ -2,14 +2,27 @@ from flask import Flask, request, render_template, send_file, jsonify
 import os
 import MailHandling
 import pdfGen
+import subprocess
 import json
 import interactionReviewWithGpt
 import time
 import dotenv
 from datetime import datetime
+from urllib.parse import urljoin
 import requests
+from requests.adapters import HTTPAdapter
 import logging
-from flask_socketio import SocketIO, emit
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from werkzeug.utils import secure_filename
+from uploadJobs import UploadJobStore, ProgressThrottle, ChunkedUploadStore, ChunkedUploadError
+from audioExtraction import extract_audio, AUDIO_EXTRACTION_MODES
+from flask_socketio import SocketIO, emit, join_room
+
+try:
+    from requests_toolbelt import MultipartEncoder
+except ImportError:
+    MultipartEncoder = None
 
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*")
@@ -21,11 +34,55 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
 # Allowed extensions
-ALLOWED_EXTENSIONS = {'txt', 'mp4', 'avi', 'mov', 'mkv'}
+ALLOWED_EXTENSIONS = {'txt', 'mp4', 'avi', 'mov', 'mkv', 'mp3', 'wav', 'm4a', 'ogg', 'opus', 'flac'}
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+PROCESS_FILE_API_URL = os.environ.get('PROCESS_FILE_API_URL', 'http://localhost:7071/api/process_file_api')
+
+# Seconds to wait for the transcription API to answer once the upload has been sent
+API_TIMEOUT_SECONDS = int(os.environ.get('API_TIMEOUT_SECONDS', '3600'))
+
+# One pooled session keeps connections to the transcription API alive across uploads
+api_session = requests.Session()
+api_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=int(os.environ.get('API_POOL_SIZE', '10')))
+api_session.mount('http://', api_adapter)
+api_session.mount('https://', api_adapter)
+
+# Uploads are processed in the background by a bounded pool; their state is kept in jobs/ for the UI
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', '2'))
+MAX_QUEUED_UPLOADS = int(os.environ.get('MAX_QUEUED_UPLOADS', '50'))
+upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='upload-job')
+upload_jobs = UploadJobStore(os.environ.get('UPLOAD_JOBS_FOLDER', 'jobs'))
+
+# Large files are sent in chunks that can be retried, resumed and sent in parallel
+chunked_uploads = ChunkedUploadStore(
+    os.environ.get('CHUNKED_UPLOADS_FOLDER', os.path.join(UPLOAD_FOLDER, 'chunked')),
+    chunk_size=int(os.environ.get('UPLOAD_CHUNK_MB', '8')) * 1024 * 1024,
+    ttl_seconds=int(os.environ.get('UPLOAD_SESSION_TTL_HOURS', '24')) * 3600,
+    max_size=int(os.environ.get('UPLOAD_MAX_MB', '10240')) * 1024 * 1024
+)
+
+# Keep each job's transcript as jobs/<job id>-conversation.json, for debugging or re-running the analysis
+SAVE_CONVERSATIONS = os.environ.get('SAVE_CONVERSATIONS', 'false').lower() in ('1', 'true', 'yes')
+
+# Progress events go only to the job's Socket.IO room, at most once per interval for each job
+PROGRESS_MIN_INTERVAL_SECONDS = float(os.environ.get('PROGRESS_MIN_INTERVAL_SECONDS', '0.5'))
+
+# Seconds between status polls while the transcription API works on a job
+API_POLL_SECONDS = float(os.environ.get('API_POLL_SECONDS', '2'))
+
+# Send only the audio track of videos to the API: off, copy, opus or flac (see audioExtraction)
+AUDIO_EXTRACTION = os.environ.get('AUDIO_EXTRACTION', 'off').lower()
+AUDIO_OPUS_BITRATE = os.environ.get('AUDIO_OPUS_BITRATE', '32k')
+if AUDIO_EXTRACTION != 'off' and AUDIO_EXTRACTION not in AUDIO_EXTRACTION_MODES:
+    logging.warning(f"Unknown AUDIO_EXTRACTION '{AUDIO_EXTRACTION}', videos are sent as they are.")
+    AUDIO_EXTRACTION = 'off'
+
+if MultipartEncoder is None:
+    logging.warning("requests-toolbelt is not installed, uploads to the API are buffered in memory.")
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -41,108 +98,318 @@ def txt():
 def handle_connect():
     emit('connected', {'message': 'Connected successfully.'})
 
-@app.route('/upload', methods=['POST'])
-def upload_file():
-    logging.info("Received a file upload request.")
-
-    if 'file' not in request.files:
-        logging.error("No file part in the request.")
-        return "No file part in the request", 400
-
-    file = request.files['file']
-    recipients = request.form.get('recipients', '').split(',')
-
+@socketio.on('join_job')
+def handle_join_job(data):
+    job_id = (data or {}).get('job_id')
+    job = upload_jobs.get(job_id) if job_id else None
+    if job is None:
+        emit('job_progress', {'job_id': job_id, 'status': 'failed', 'error': 'Job not found'})
+        return
+    join_room(job_id)
+    # Bring a client that joined late or reconnected up to date without waiting for the next update
+    emit('job_progress', {
+        'job_id': job_id, 'status': job['status'], 'stage': job['stage'],
+        'progress': job['progress'], 'error': job['error']
+    })
+    if job_id in live_dialogs:
+        emit('dialog_entries', {'job_id': job_id, 'start': 0, 'entries': live_dialogs[job_id]})
+
+def parse_recipients(value):
     # Trim whitespace from recipient emails
-    recipients = [email.strip() for email in recipients if email.strip()]
+    return [email.strip() for email in (value or '').split(',') if email.strip()]
 
+def upload_error(filename, recipients):
+    # Returns the (message, status code) rejecting an upload, or None when it may go ahead
     if not recipients:
         logging.error("No recipient email addresses provided.")
         return "No recipient email addresses provided", 400
 
-    if file.filename == '':
+    if not filename:
         logging.error("No selected file.")
         return "No selected file", 400
 
-    if file and allowed_file(file.filename):
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-        total_size = int(request.content_length)
-        uploaded_size = 0
-
-        with open(file_path, 'wb') as f:
-            chunk_size = 1024 * 1024  # 1MB chunk size
-            while chunk := file.stream.read(chunk_size):
-                f.write(chunk)
-                uploaded_size += len(chunk)
-                progress = int((uploaded_size / total_size) * 40)  # File upload represents 40% of the progress
-                socketio.emit('upload_progress', {'progress': progress}, namespace='/')
-
-        logging.info(f"File saved to {file_path}.")
+    if not allowed_file(filename):
+        logging.warning("File type not allowed.")
+        return "File type not allowed", 400
 
-        # Send the file as part of a POST request
-        try:
-            with open(file_path, 'rb') as f:
-                response = requests.post(
-                    'http://localhost:7071/api/process_file_api',
-                    files={'file': f}
-                )
-            logging.info(f"File sent to API. Status code: {response.status_code}")
-
-            if response.status_code == 200:
-                logging.info("File processed successfully.")
-
-                # Get the entire response JSON
-                response_data = response.json()
-                if isinstance(response_data, list):
-                    json_data = response_data[0]  # Pick the first element if it's a list
-                else:
-                    json_data = response_data
-
-                # Write the response JSON to conversation.json
-                with open('conversation.json', 'w') as json_file:
-                    json.dump(response_data, json_file, indent=4)
-
-                logging.info("Response JSON stored in conversation.json.")
-                socketio.emit('upload_progress', {'progress': 60}, namespace='/')  # Processing done, 60% progress
-
-                # Execute the following code only on successful POST
-                logging.info("Fetching conversation...")
-                logging.info("Analysing the conversation...")
-                printTime()
-                json_data = interactionReviewWithGpt.main()
-
-                printTime()
-
-                logging.info("Got response.")
-                printTime()
-                logging.info("Generating PDF...")
-                name = generatePDF(json_data)
-
-                # Emit progress for PDF generation
-                socketio.emit('upload_progress', {'progress': 80}, namespace='/')
-
-                logging.info("Sending mail with PDF...")
-                printTime()
+    if upload_jobs.count('queued') >= MAX_QUEUED_UPLOADS:
+        logging.warning("Upload queue is full.")
+        return "Too many uploads are waiting to be processed, please try again later", 503
+    return None
 
-                MailHandling.process_and_send_email(recipients, json_data, pdf_path=r'storedPDF/' + name)
+def job_accepted(job_id, filename, recipients):
+    return jsonify({
+        "status": "queued",
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}",
+        "file": filename,
+        "recipients": recipients
+    }), 202
 
-                # Emit progress for email sent
-                socketio.emit('upload_progress', {'progress': 100}, namespace='/')
-
-                return jsonify({
-                    "status": "success",
-                    "message": "File uploaded and email sent successfully.",
-                    "file": file.filename,
-                    "recipients": recipients
-                }), 200
+@app.route('/upload', methods=['POST'])
+def upload_file():
+    logging.info("Received a file upload request.")
 
-            else:
-                logging.error("Failed to process file.")
-                return "Error processing file", 500
-        except Exception as e:
-            logging.exception("An error occurred while sending the file to the API.")
+    if 'file' not in request.files:
+        logging.error("No file part in the request.")
+        return "No file part in the request", 400
 
-    logging.warning("File type not allowed.")
-    return "File type not allowed", 400
+    file = request.files['file']
+    recipients = parse_recipients(request.form.get('recipients'))
+    error = upload_error(file.filename, recipients)
+    if error:
+        return error
+
+    job_id = upload_jobs.create(file.filename, recipients)
+    # Prefix the job ID so concurrent uploads of files with the same name do not overwrite each other
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{secure_filename(file.filename)}")
+
+    # The browser tracks the progress of its own upload, so nothing is emitted while the file arrives
+    with open(file_path, 'wb') as f:
+        chunk_size = 1024 * 1024  # 1MB chunk size
+        while chunk := file.stream.read(chunk_size):
+            f.write(chunk)
+
+    logging.info(f"File saved to {file_path}.")
+
+    # The rest of the pipeline runs on the worker pool so the request returns right away
+    upload_executor.submit(run_upload_job, job_id, file_path, file.filename, recipients)
+    logging.info(f"Queued upload job {job_id}.")
+    return job_accepted(job_id, file.filename, recipients)
+
+# Chunked uploads: POST /uploads starts one, PUT /uploads/<id>/chunks/<n> sends chunk n (in any order,
+# in parallel and as often as needed), GET /uploads/<id> lists the chunks received so far for resuming,
+# and POST /uploads/<id>/complete verifies the assembled file and queues it like /upload does.
+# Transcription starts only once the whole file has arrived: MP4 files usually keep their index (moov atom)
+# at the end, so the leading chunks cannot be decoded on their own, and the API takes whole files.
+@app.route('/uploads', methods=['POST'])
+def start_chunked_upload():
+    body = request.get_json(silent=True) or {}
+    filename = body.get('filename', '')
+    recipients = parse_recipients(body.get('recipients'))
+    error = upload_error(filename, recipients)
+    if error:
+        return error
+    try:
+        size = int(body.get('size', 0))
+        upload = chunked_uploads.create(filename, size, {'recipients': recipients}, body.get('checksum'))
+    except ValueError:
+        return "The file size must be an integer", 400
+    except ChunkedUploadError as e:
+        return str(e), e.status_code
+    return jsonify(upload), 201
+
+@app.route('/uploads/<upload_id>')
+def chunked_upload_status(upload_id):
+    try:
+        return jsonify(chunked_uploads.get(upload_id))
+    except ChunkedUploadError as e:
+        return str(e), e.status_code
+
+@app.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    try:
+        received = chunked_uploads.put_chunk(upload_id, index, request.stream, request.headers.get('X-Chunk-SHA256'))
+    except ChunkedUploadError as e:
+        return str(e), e.status_code
+    return jsonify({"index": index, "received": received})
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    def run_and_release(job_id, upload):
+        try:
+            run_upload_job(job_id, upload['path'], upload['filename'], upload['fields']['recipients'])
+        finally:
+            chunked_uploads.release(upload['id'])
+
+    def start_job(upload):
+        recipients = upload['fields']['recipients']
+        job_id = upload_jobs.create(upload['filename'], recipients)
+        upload_executor.submit(run_and_release, job_id, upload)
+        logging.info(f"Queued upload job {job_id}.")
+        return job_id
+
+    try:
+        checksum = (request.get_json(silent=True) or {}).get('checksum')
+        job_id = chunked_uploads.complete(upload_id, start_job, checksum)
+    except ChunkedUploadError as e:
+        return str(e), e.status_code
+    upload = chunked_uploads.get(upload_id)
+    return job_accepted(job_id, upload['filename'], upload['fields']['recipients'])
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return "Job not found", 404
+    return jsonify(job)
+
+def emit_job_progress(job_id, payload):
+    socketio.emit('job_progress', dict(payload, job_id=job_id), to=job_id, namespace='/')
+
+# Dialog entries the API has labeled so far for each running job, sent again to clients that join late
+live_dialogs = {}
+
+def dialog_reporter(job_id):
+    # Entries from `start` on replace what the job's room was sent before, since a relabeled window takes entries back
+    def send(start, entries):
+        dialog = live_dialogs.setdefault(job_id, [])
+        dialog[start:] = entries
+        socketio.emit('dialog_entries', {'job_id': job_id, 'start': start, 'entries': entries}, to=job_id, namespace='/')
+    return send
+
+def progress_reporter(job_id):
+    # Keeps the stored job progress in step with what the job's room is sent
+    def send(payload):
+        upload_jobs.set_progress(job_id, payload['progress'])
+        emit_job_progress(job_id, payload)
+    return ProgressThrottle(send, PROGRESS_MIN_INTERVAL_SECONDS)
+
+@contextmanager
+def job_stage(job_id, stage, progress):
+    # Records when a stage of an upload job started and how long it took, and reports its start and end
+    upload_jobs.start_stage(job_id, stage)
+    progress.update(stage, 0)
+    try:
+        yield
+    finally:
+        upload_jobs.finish_stage(job_id, stage)
+    progress.update(stage, 100)
+
+def run_upload_job(job_id, file_path, filename, recipients):
+    progress = progress_reporter(job_id)
+    try:
+        # Send the file to the API as a job and follow its progress until the transcript is ready
+        with job_stage(job_id, 'transcribe', progress):
+            send_path, send_name, transfer = prepare_api_upload(file_path, filename)
+            try:
+                response_data = transcribe_with_api(
+                    send_path, send_name, lambda percent: progress.update('transcribe', percent), transfer,
+                    on_dialog=dialog_reporter(job_id)
+                )
+            finally:
+                if send_path != file_path:
+                    os.remove(send_path)
+                live_dialogs.pop(job_id, None)
+        logging.info(f"File processed successfully. Transfer: {transfer}")
+
+        result = {'transfer': transfer}
+        with job_stage(job_id, 'analyze', progress):
+            if SAVE_CONVERSATIONS:
+                conversation_path = upload_jobs.save_artifact(job_id, 'conversation', response_data)
+                result['conversation'] = conversation_path
+                logging.info(f"Response JSON stored in {conversation_path}.")
+
+            # The transcript is analysed in memory, so concurrent jobs never share a file
+            logging.info("Analysing the conversation...")
+            printTime()
+            json_data = interactionReviewWithGpt.analyze_meeting(response_data)
+            printTime()
+
+        logging.info("Got response.")
+        printTime()
+        logging.info("Generating PDF...")
+        with job_stage(job_id, 'pdf', progress):
+            name = generatePDF(json_data)
+
+        logging.info("Sending mail with PDF...")
+        printTime()
+        with job_stage(job_id, 'email', progress):
+            MailHandling.process_and_send_email(recipients, json_data, pdf_path=r'storedPDF/' + name)
+
+        result['pdf'] = name
+        upload_jobs.complete(job_id, result)
+        progress.cancel()
+        emit_job_progress(job_id, {'status': 'completed', 'stage': 'completed', 'progress': 100})
+        logging.info(f"Upload job {job_id} completed.")
+    except Exception as e:
+        logging.exception(f"Upload job {job_id} failed.")
+        upload_jobs.fail(job_id, str(e))
+        # An update of the failed stage still waiting to be sent would arrive after the failure
+        progress.cancel()
+        emit_job_progress(job_id, {'status': 'failed', 'error': str(e)})
+    finally:
+        # The uploaded file is only needed while the job runs, whether it succeeded or not
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+def prepare_api_upload(file_path, filename):
+    # Returns the path and name to send to the API, and the bytes that will be sent
+    transfer = {'mode': 'off', 'bytes': os.path.getsize(file_path)}
+    if AUDIO_EXTRACTION == 'off':
+        return file_path, filename, transfer
+    try:
+        audio_path, stats = extract_audio(file_path, AUDIO_EXTRACTION, AUDIO_OPUS_BITRATE)
+    except (OSError, subprocess.CalledProcessError) as e:
+        # The API decodes the original just as well, it only takes longer to send
+        logging.warning(f"Audio extraction failed, sending the original file: {getattr(e, 'stderr', None) or str(e)}")
+        return file_path, filename, transfer
+    if audio_path is None:
+        return file_path, filename, transfer
+    return audio_path, os.path.splitext(filename)[0] + os.path.splitext(audio_path)[1], stats
+
+def transcribe_with_api(file_path, filename, on_progress, transfer=None, on_dialog=None):
+    # Queue the file as an API job, report its progress while it runs and return the Meeting JSON
+    # The time taken to send the file is added to `transfer`
+    # `on_dialog(start, entries)` receives the Dialog entries labeled so far, replacing those it got from `start` on
+    upload_start = time.perf_counter()
+    response = post_file_to_api(file_path, filename, url=f"{PROCESS_FILE_API_URL}/jobs")
+    if transfer is not None:
+        transfer['upload_seconds'] = round(time.perf_counter() - upload_start, 3)
+    logging.info(f"File sent to API. Status code: {response.status_code}")
+    if response.status_code != 202:
+        raise RuntimeError(f"Error processing file: {response.text}")
+    status = response.json()
+    deadline = time.monotonic() + API_TIMEOUT_SECONDS
+    dialog_after, dialog_revision = 0, 0
+    while status['Status'] not in ('completed', 'failed'):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Transcription job {status['JobId']} did not finish in {API_TIMEOUT_SECONDS}s")
+        time.sleep(API_POLL_SECONDS)
+        response = api_session.get(urljoin(PROCESS_FILE_API_URL, status['StatusUrl']), timeout=(10, 60))
+        response.raise_for_status()
+        status = response.json()
+        on_progress(status['Progress'])
+        if on_dialog is not None and status.get('DialogUrl'):
+            dialog_after, dialog_revision = poll_api_dialog(status, dialog_after, dialog_revision, on_dialog)
+    if status['Status'] == 'failed':
+        raise RuntimeError(f"Error processing file: {status['Error']}")
+    response = api_session.get(urljoin(PROCESS_FILE_API_URL, status['ResultUrl']), timeout=(10, 60))
+    response.raise_for_status()
+    return response.json()
+
+def poll_api_dialog(status, after, revision, on_dialog):
+    # Fetches the Dialog entries labeled since the last poll and returns where the next poll starts
+    # The entries are only a preview of the result, so a failed poll is retried on the next one
+    try:
+        response = api_session.get(
+            urljoin(PROCESS_FILE_API_URL, status['DialogUrl']), params={'after': after, 'revision': revision},
+            timeout=(10, 60)
+        )
+        response.raise_for_status()
+        entries = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+    except (requests.RequestException, ValueError) as e:
+        logging.warning(f"Could not fetch the dialog of transcription job {status['JobId']}: {str(e)}")
+        return after, revision
+    start = int(response.headers.get('X-Dialog-Reset', after))
+    if entries or start < after:
+        on_dialog(start, entries)
+    return start + len(entries), int(response.headers.get('X-Dialog-Revision', revision))
+
+def post_file_to_api(file_path, filename, url=PROCESS_FILE_API_URL):
+    # Stream the multipart body from disk so forwarding a large video uses constant memory
+    with open(file_path, 'rb') as f:
+        if MultipartEncoder is None:
+            return api_session.post(url, files={'file': (filename, f)}, timeout=(10, API_TIMEOUT_SECONDS))
+        encoder = MultipartEncoder(fields={'file': (filename, f, 'application/octet-stream')})
+        return api_session.post(
+            url,
+            data=encoder,
+            headers={'Content-Type': encoder.content_type},
+            timeout=(10, API_TIMEOUT_SECONDS)
+        )
 
 def generatePDF(json_body=None):
     return pdfGen.create_pdf_report(json_body)
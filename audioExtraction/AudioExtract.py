@@ -0,0 +1,48 @@
+import logging
+import os
+import subprocess
+import time
+
+# How the audio track is prepared before a video is sent to the transcription API:
+#   copy - the audio stream as it is, remuxed into Matroska audio without re-encoding
+#   opus - 16 kHz mono Opus, a few MB per hour of speech
+#   flac - 16 kHz mono FLAC, lossless at the rate Whisper resamples to anyway
+AUDIO_EXTRACTION_MODES = {
+    'copy': ('.mka', ['-c:a', 'copy']),
+    'opus': ('.ogg', ['-ac', '1', '-ar', '16000', '-c:a', 'libopus', '-application', 'voip']),
+    'flac': ('.flac', ['-ac', '1', '-ar', '16000', '-c:a', 'flac']),
+}
+
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
+
+
+def extract_audio(video_path, mode, opus_bitrate='32k'):
+    """Write the first audio track of a video next to it and return (audio path, stats).
+
+    Returns (None, None) when the file is not a video, so the caller sends the original.
+    Raises subprocess.CalledProcessError when ffmpeg fails, for example on a video
+    without an audio track.
+    """
+    if video_path.rsplit('.', 1)[-1].lower() not in VIDEO_EXTENSIONS:
+        return None, None
+    extension, codec_args = AUDIO_EXTRACTION_MODES[mode]
+    if mode == 'opus':
+        codec_args = codec_args + ['-b:a', opus_bitrate]
+    audio_path = os.path.splitext(video_path)[0] + extension
+    ffmpeg_command = [
+        'ffmpeg', '-nostdin', '-loglevel', 'error', '-y', '-i', video_path,
+        '-vn', '-sn', '-dn', '-map', '0:a:0', *codec_args, audio_path
+    ]
+    start = time.perf_counter()
+    subprocess.run(ffmpeg_command, check=True, capture_output=True)
+    stats = {
+        'mode': mode,
+        'original_bytes': os.path.getsize(video_path),
+        'bytes': os.path.getsize(audio_path),
+        'extract_seconds': round(time.perf_counter() - start, 3),
+    }
+    logging.info(
+        f"Extracted the audio track with '{mode}' in {stats['extract_seconds']}s: "
+        f"{stats['original_bytes']} -> {stats['bytes']} bytes."
+    )
+    return audio_path, stats
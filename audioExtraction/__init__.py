@@ -0,0 +1 @@
+from .AudioExtract import extract_audio, AUDIO_EXTRACTION_MODES
@@ -0,0 +1,45 @@
+"""Compare transcription backends on CPU throughput and memory.
+
+Every backend transcribes the same clips in its own process. When a clip has a
+reference transcript next to it (clip.wav + clip.txt) the word error rate is
+reported too, otherwise transcripts are compared against the first backend.
+
+    python -m benchmarks.backends --samples path/to/clips --model small --backends whisper,faster-whisper
+"""
+import argparse
+import json
+import os
+
+from benchmarks.common import benchmark_variant, load_samples, prepare_environment, print_results, run_isolated, word_error_rate
+
+prepare_environment()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", required=True, help="Directory of audio clips to transcribe")
+    parser.add_argument("--model", default="small", help="Model size loaded by every backend")
+    parser.add_argument("--backends", default="whisper,faster-whisper", help="Comma separated backends to compare")
+    parser.add_argument("--int8", action="store_true", help="Run every backend with int8 weights")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    references = {name: reference for name, _, reference in load_samples(args.samples) if reference}
+    results = []
+    for backend in [name.strip() for name in args.backends.split(",") if name.strip()]:
+        result = run_isolated(benchmark_variant, args.samples, args.model, backend, args.int8)
+        baseline = references or (results[0]["transcripts"] if results else result["transcripts"])
+        scores = [word_error_rate(baseline[name], text) for name, text in result["transcripts"].items() if name in baseline]
+        result["mean_wer"] = round(sum(scores) / len(scores), 4) if scores else None
+        results.append(result)
+
+    print(f"Samples: {os.path.abspath(args.samples)} ({'references' if references else 'compared to ' + results[0]['variant']})")
+    print_results(results, extra_columns=["mean_wer"])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump({"model": args.model, "results": results}, output, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare Whisper cold starts from the downloaded checkpoint and from the memory-mapped weight cache.
+
+Every variant loads the model in a fresh process and reports the load time, the
+resident memory of the process and how much of it is anonymous memory. Mapped
+weights are file-backed page cache, so only the anonymous part is private to a
+worker; the rest is shared by every worker on the host.
+
+    python -m benchmarks.cold_start --model small --cache-dir /tmp/whisper_weights
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.common import prepare_environment, run_isolated
+
+prepare_environment()
+
+
+def memory_mb():
+    """Return resident and anonymous memory of the current process in MB from /proc/self/smaps_rollup."""
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as smaps:
+            for line in smaps:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return {}
+    return {"rss_mb": round(fields.get("Rss", 0)), "anonymous_mb": round(fields.get("Anonymous", 0))}
+
+
+def load_variant(model_name, cache_dir):
+    """Load one model on CPU in this process and report how long it took and the memory it holds."""
+    os.environ["WHISPER_WEIGHT_CACHE_DIR"] = cache_dir
+    from process_file_api.model_registry import ModelRegistry
+
+    before = memory_mb()
+    registry = ModelRegistry(device="cpu")
+    start = time.perf_counter()
+    registry.get(model_name)
+    load_seconds = time.perf_counter() - start
+    after = memory_mb()
+    return {
+        "variant": "mapped" if cache_dir else "checkpoint",
+        "load_seconds": round(load_seconds, 3),
+        "rss_before_mb": before.get("rss_mb"),
+        "rss_after_mb": after.get("rss_mb"),
+        "anonymous_after_mb": after.get("anonymous_mb"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="small", help="Whisper model size")
+    parser.add_argument("--cache-dir", required=True, help="Directory for the memory-mapped weight cache")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    # The first cached load writes the cache, so it is run once before the measured variants
+    run_isolated(load_variant, args.model, args.cache_dir)
+    results = [
+        run_isolated(load_variant, args.model, ""),
+        run_isolated(load_variant, args.model, args.cache_dir),
+    ]
+
+    columns = ["load_seconds", "rss_before_mb", "rss_after_mb", "anonymous_after_mb"]
+    print(f"{'variant':<12}" + "".join(f"{column:>22}" for column in columns))
+    for result in results:
+        print(f"{result['variant']:<12}" + "".join(f"{str(result[column]):>22}" for column in columns))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump({"model": args.model, "results": results}, output, indent=4)
+
+
+if __name__ == "__main__":
+    main()
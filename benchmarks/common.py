@@ -0,0 +1,134 @@
+import os
+import re
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+# Make the repository importable when the benchmarks are run as scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".opus", ".mp4", ".mkv", ".mov", ".avi")
+
+
+def prepare_environment():
+    """Keep process_file_api from preloading models, starting job workers or caching results on import."""
+    os.environ.setdefault("WHISPER_PRELOAD_MODELS", "")
+    os.environ.setdefault("JOB_WORKERS", "0")
+    os.environ.setdefault("TRANSCRIPT_CACHE_MAX_MB", "0")
+
+
+def load_samples(directory):
+    """Return (name, 16 kHz samples, reference text or None) for every audio clip in a directory."""
+    import whisper
+
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(AUDIO_EXTENSIONS):
+            continue
+        reference_path = os.path.join(directory, os.path.splitext(name)[0] + ".txt")
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, "r", encoding="utf-8") as reference_file:
+                reference = reference_file.read()
+        samples.append((name, whisper.load_audio(os.path.join(directory, name)), reference))
+    if not samples:
+        raise SystemExit(f"No audio clips found in {directory}.")
+    return samples
+
+
+def synthetic_samples(seconds=30, sample_rate=16000, seed=0):
+    """Return (name, samples, reference) clips with no speech in them, for runs without recordings.
+
+    Their reference transcript is empty, so any words Whisper produces are hallucinations,
+    which is what settings such as no_speech_threshold are meant to prevent.
+    """
+    import numpy as np
+
+    generator = np.random.default_rng(seed)
+    length = seconds * sample_rate
+    time_axis = np.arange(length) / sample_rate
+    # Half-second 440 Hz beeps once per second
+    beeps = 0.2 * np.sin(2 * np.pi * 440 * time_axis) * ((time_axis % 1.0) < 0.5)
+    clips = {
+        "synthetic_silence": np.zeros(length),
+        "synthetic_noise": 0.01 * generator.standard_normal(length),
+        "synthetic_beeps": beeps + 0.002 * generator.standard_normal(length),
+    }
+    return [(name, audio.astype(np.float32), "") for name, audio in clips.items()]
+
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance between two texts, divided by the reference length."""
+    reference_words = normalize_words(reference)
+    hypothesis_words = normalize_words(hypothesis)
+    if not reference_words:
+        return 0.0 if not hypothesis_words else 1.0
+    previous = list(range(len(hypothesis_words) + 1))
+    for i, reference_word in enumerate(reference_words, 1):
+        current = [i]
+        for j, hypothesis_word in enumerate(hypothesis_words, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (reference_word != hypothesis_word),
+            ))
+        previous = current
+    return previous[-1] / len(reference_words)
+
+
+def peak_rss_mb():
+    """Peak resident memory of the current process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def run_isolated(function, *args):
+    """Run a benchmark variant in a fresh process so its memory numbers are not shared with other variants."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(function, *args).result()
+
+
+def benchmark_variant(samples_dir, model_name, backend="whisper", quantize=False):
+    """Load one model variant on CPU, transcribe every sample and report speed and memory."""
+    from process_file_api import config
+    from process_file_api.config import SAMPLE_RATE
+    from process_file_api.model_registry import ModelRegistry, model_label
+
+    samples = load_samples(samples_dir)
+    registry = ModelRegistry(device="cpu", backend=backend)
+    model = registry.get(model_name, quantize=quantize)
+
+    transcripts = {}
+    audio_seconds = 0.0
+    start = time.perf_counter()
+    for name, audio, _ in samples:
+        transcripts[name] = model.transcribe(audio, fp16=False, **config.WHISPER_TRANSCRIBE_OPTIONS)["text"]
+        audio_seconds += len(audio) / SAMPLE_RATE
+    elapsed = time.perf_counter() - start
+
+    return {
+        "variant": f"{backend}:{model_label(model_name, 'cpu', quantize)}",
+        "load_seconds": round(next(iter(registry.load_times.values())), 3),
+        "audio_seconds": round(audio_seconds, 2),
+        "transcribe_seconds": round(elapsed, 2),
+        "real_time_factor": round(elapsed / audio_seconds, 4) if audio_seconds else None,
+        "audio_seconds_per_second": round(audio_seconds / elapsed, 2) if elapsed else None,
+        "peak_rss_mb": round(peak_rss_mb()),
+        "transcripts": transcripts,
+    }
+
+
+def print_results(results, extra_columns=()):
+    """Print one line per variant with the shared speed and memory columns."""
+    columns = ["load_seconds", "real_time_factor", "audio_seconds_per_second", "peak_rss_mb", *extra_columns]
+    print(f"{'variant':<36}" + "".join(f"{column:>26}" for column in columns))
+    for result in results:
+        print(f"{result['variant']:<36}" + "".join(f"{str(result.get(column, '')):>26}" for column in columns))
@@ -0,0 +1,40 @@
+"""Compare fp32 and dynamically quantized int8 Whisper on CPU.
+
+Reports real-time factor, peak resident memory and how far the int8 transcripts
+drift from the fp32 ones (word error rate with fp32 as the reference).
+
+    python -m benchmarks.quantization --samples path/to/clips --model small
+"""
+import argparse
+import json
+
+from benchmarks.common import benchmark_variant, prepare_environment, print_results, run_isolated, word_error_rate
+
+prepare_environment()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", required=True, help="Directory of audio clips to transcribe")
+    parser.add_argument("--model", default="small", help="Whisper model size")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    fp32 = run_isolated(benchmark_variant, args.samples, args.model, "whisper", False)
+    int8 = run_isolated(benchmark_variant, args.samples, args.model, "whisper", True)
+    drift = {
+        name: round(word_error_rate(fp32["transcripts"][name], int8["transcripts"][name]), 4)
+        for name in fp32["transcripts"]
+    }
+    int8["drift_wer"] = drift
+    int8["mean_drift_wer"] = round(sum(drift.values()) / len(drift), 4)
+
+    print_results([fp32, int8], extra_columns=["mean_drift_wer"])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump({"model": args.model, "results": [fp32, int8]}, output, indent=4)
+
+
+if __name__ == "__main__":
+    main()
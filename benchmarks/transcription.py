@@ -0,0 +1,157 @@
+"""Real-time factor and accuracy of the transcription path for several model sizes and settings.
+
+Every (model, configuration) pair runs transcribe_audio_with_whisper in its own
+process on the same clips, and reports model load time, real-time factor, peak
+resident memory and word error rate against the reference transcripts
+(clip.wav + clip.txt). Without --samples, synthetic clips without speech are
+used and every transcribed word counts as a hallucination.
+
+    python -m benchmarks.transcription --samples path/to/clips --models base,small --output results.json
+    python -m benchmarks.transcription --models tiny --compare results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import time
+
+from benchmarks.common import (
+    load_samples, normalize_words, peak_rss_mb, prepare_environment, print_results, run_isolated,
+    synthetic_samples, word_error_rate,
+)
+
+prepare_environment()
+
+# Overrides of WHISPER_TRANSCRIBE_OPTIONS compared by default
+CONFIGURATIONS = {
+    "default": {},
+    "no_condition": {"condition_on_previous_text": False},
+    "no_speech_0.6": {"no_speech_threshold": 0.6},
+}
+
+
+def benchmark_configuration(samples_dir, model_name, configuration):
+    """Transcribe every clip with one model and configuration on CPU and score the transcripts."""
+    import process_file_api
+    from process_file_api import config
+    from process_file_api.config import SAMPLE_RATE
+    from process_file_api.model_registry import ModelRegistry
+
+    samples = load_samples(samples_dir) if samples_dir else synthetic_samples()
+    config.WHISPER_TRANSCRIBE_OPTIONS.update(CONFIGURATIONS[configuration])
+    registry = ModelRegistry(device="cpu")
+    load_start = time.perf_counter()
+    model = registry.get(model_name)
+    load_seconds = time.perf_counter() - load_start
+
+    per_sample = {}
+    audio_seconds = 0.0
+    start = time.perf_counter()
+    for name, audio, reference in samples:
+        sample_start = time.perf_counter()
+        text = process_file_api.transcribe_audio_with_whisper(model, audio)["text"]
+        sample_seconds = time.perf_counter() - sample_start
+        per_sample[name] = {
+            "audio_seconds": round(len(audio) / SAMPLE_RATE, 2),
+            "real_time_factor": round(sample_seconds / (len(audio) / SAMPLE_RATE), 4),
+            "wer": round(word_error_rate(reference, text), 4) if reference else None,
+            "words": len(normalize_words(text)),
+            "transcript": text,
+        }
+        if reference == "":
+            per_sample[name]["hallucinated_words"] = per_sample[name]["words"]
+        audio_seconds += len(audio) / SAMPLE_RATE
+    elapsed = time.perf_counter() - start
+
+    scores = [sample["wer"] for sample in per_sample.values() if sample["wer"] is not None]
+    hallucinations = [sample["hallucinated_words"] for sample in per_sample.values() if "hallucinated_words" in sample]
+    return {
+        "variant": f"{model_name}:{configuration}",
+        "model": model_name,
+        "configuration": configuration,
+        "options": dict(config.WHISPER_TRANSCRIBE_OPTIONS),
+        "load_seconds": round(load_seconds, 3),
+        "audio_seconds": round(audio_seconds, 2),
+        "transcribe_seconds": round(elapsed, 2),
+        "real_time_factor": round(elapsed / audio_seconds, 4) if audio_seconds else None,
+        "audio_seconds_per_second": round(audio_seconds / elapsed, 2) if elapsed else None,
+        "peak_rss_mb": round(peak_rss_mb()),
+        "mean_wer": round(sum(scores) / len(scores), 4) if scores else None,
+        "hallucinated_words": sum(hallucinations) if hallucinations else None,
+        "samples": per_sample,
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results, previous):
+    """Print how each variant moved relative to the same variant in an earlier results file."""
+    earlier = {result["variant"]: result for result in previous["results"]}
+    print(f"\nCompared to {previous.get('commit') or 'previous run'}:")
+    for result in results:
+        before = earlier.get(result["variant"])
+        if before is None:
+            continue
+        changes = []
+        for column in ("real_time_factor", "load_seconds", "peak_rss_mb", "mean_wer", "hallucinated_words"):
+            if result.get(column) is not None and before.get(column) is not None:
+                changes.append(f"{column} {before[column]} -> {result[column]}")
+        print(f"{result['variant']:<36}" + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", help="Directory of audio clips with .txt references (synthetic clips when omitted)")
+    parser.add_argument("--models", default="tiny,base,small", help="Comma separated Whisper model sizes")
+    parser.add_argument(
+        "--configs", default=",".join(CONFIGURATIONS), help=f"Comma separated configurations from {sorted(CONFIGURATIONS)}"
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    configurations = [name.strip() for name in args.configs.split(",") if name.strip()]
+    unknown = set(configurations) - set(CONFIGURATIONS)
+    if unknown:
+        raise SystemExit(f"Unknown configurations: {sorted(unknown)}")
+
+    results = []
+    for model_name in [name.strip() for name in args.models.split(",") if name.strip()]:
+        for configuration in configurations:
+            results.append(run_isolated(benchmark_configuration, args.samples, model_name, configuration))
+
+    print(f"Samples: {os.path.abspath(args.samples) if args.samples else 'synthetic clips without speech'}")
+    print_results(results, extra_columns=["mean_wer", "hallucinated_words"])
+
+    report = {
+        "commit": current_commit(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "samples": os.path.abspath(args.samples) if args.samples else "synthetic",
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as previous_file:
+            print_comparison(results, json.load(previous_file))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Bytes sent and end-to-end latency of the UI -> API hop, with and without extracting the audio first.
+
+For every mode the video is prepared the way the UI's AUDIO_EXTRACTION setting does it
+("off" sends the original) and the result is posted to the synchronous API endpoint, so
+the latency covers extraction, transfer and processing. Without --api-url only the
+extraction is run, and the transfer time is estimated from --bandwidth-mbps.
+
+    python -m benchmarks.upload_hop --video meeting.mp4 --api-url http://localhost:7071/api/process_file_api
+    python -m benchmarks.upload_hop --video meeting.mp4 --bandwidth-mbps 20
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import benchmarks.common  # noqa: F401 - makes the repository importable
+from audioExtraction import extract_audio, AUDIO_EXTRACTION_MODES
+
+
+def measure_mode(video_path, mode, api_url, bandwidth_mbps, opus_bitrate):
+    """Prepare the video for one mode and send it, returning bytes and seconds spent on each step."""
+    start = time.perf_counter()
+    if mode == "off":
+        send_path, stats = video_path, {"mode": "off", "original_bytes": os.path.getsize(video_path), "extract_seconds": 0.0}
+        stats["bytes"] = stats["original_bytes"]
+    else:
+        send_path, stats = extract_audio(video_path, mode, opus_bitrate)
+        if send_path is None:
+            raise SystemExit(f"{video_path} is not a video file.")
+    result = dict(stats)
+    result["variant"] = mode
+    result["compression_ratio"] = round(stats["original_bytes"] / stats["bytes"], 1) if stats["bytes"] else None
+    result["estimated_transfer_seconds"] = round(stats["bytes"] * 8 / (bandwidth_mbps * 1e6), 2)
+
+    try:
+        if api_url:
+            import requests
+
+            with open(send_path, "rb") as upload:
+                response = requests.post(api_url, files={"file": (os.path.basename(send_path), upload)}, timeout=3600)
+            result["status_code"] = response.status_code
+            result["api_seconds"] = round(time.perf_counter() - start - stats["extract_seconds"], 3)
+            result["server_timing"] = response.headers.get("Server-Timing")
+        result["end_to_end_seconds"] = round(
+            time.perf_counter() - start + (0 if api_url else result["estimated_transfer_seconds"]), 3
+        )
+    finally:
+        if send_path != video_path:
+            os.remove(send_path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", required=True, help="Video file to send")
+    parser.add_argument("--api-url", help="Synchronous process_file_api URL; only extraction is measured without it")
+    parser.add_argument("--modes", default="off," + ",".join(AUDIO_EXTRACTION_MODES), help="Comma separated modes")
+    parser.add_argument("--bandwidth-mbps", type=float, default=20.0, help="Uplink used to estimate transfer times")
+    parser.add_argument("--opus-bitrate", default="32k", help="Bitrate of the opus mode")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = set(modes) - set(AUDIO_EXTRACTION_MODES) - {"off"}
+    if unknown:
+        raise SystemExit(f"Unknown modes: {sorted(unknown)}")
+
+    # Extracted files are written next to the input, so work on a copy in a scratch directory
+    with tempfile.TemporaryDirectory() as scratch:
+        video_path = os.path.join(scratch, os.path.basename(args.video))
+        shutil.copyfile(args.video, video_path)
+        results = [measure_mode(video_path, mode, args.api_url, args.bandwidth_mbps, args.opus_bitrate) for mode in modes]
+
+    columns = ["bytes", "compression_ratio", "extract_seconds", "estimated_transfer_seconds", "end_to_end_seconds"]
+    if args.api_url:
+        columns.insert(4, "api_seconds")
+    print(f"{'variant':<10}" + "".join(f"{column:>28}" for column in columns))
+    for result in results:
+        print(f"{result['variant']:<10}" + "".join(f"{str(result.get(column)):>28}" for column in columns))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump({"video": os.path.abspath(args.video), "results": results}, output, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,3 @@
 # from .interactionReview import generate_analysis_report
 # from .interactionReview import getJsonConversation
-from .__main__ import main
\ No newline at end of file
+from .__main__ import main, analyze_meeting
\ No newline at end of file
@@ -31,35 +31,47 @@ def load_latest_file(folder):
         exit(1)
  
  
+def meeting_conversation(data):
+    """Return the Dialog entries of a parsed Meeting dict, raising ValueError when it is malformed."""
+    if not isinstance(data, dict) or not isinstance(data.get("Meeting"), dict) or "Dialog" not in data["Meeting"]:
+        raise ValueError("Required key 'Meeting.Dialog' is missing in the JSON file.")
+
+    conversation = data["Meeting"]["Dialog"]
+    if not isinstance(conversation, list) or not all(isinstance(entry, dict) for entry in conversation):
+        raise ValueError("'Dialog' must be a list of dictionaries.")
+
+    return conversation
+
+
+def analyze_meeting(data):
+    """Generate the analysis report for a parsed Meeting dict, as returned by the transcription API.
+
+    Errors are raised instead of exiting, so the caller can run it inside a server.
+    """
+    conversation = meeting_conversation(data)
+    print("Generating analysis report...")
+    return generate_analysis_report(conversation)
+
+
 def validate_json_structure(data):
     """Validate the structure of the input JSON."""
     try:
-        if "Meeting" not in data or "Dialog" not in data["Meeting"]:
-            raise KeyError("Required key 'Meeting.Dialog' is missing in the JSON file.")
-       
-        conversation = data["Meeting"]["Dialog"]
-        if not isinstance(conversation, list) or not all(isinstance(entry, dict) for entry in conversation):
-            raise ValueError("'Dialog' must be a list of dictionaries.")
- 
-        return conversation
+        return meeting_conversation(data)
  
     except Exception as e:
         print(f"Error validating JSON structure: {e}")
         exit(1)
  
  
-def main():
+def main(path="conversation.json"):
     print("Loading the latest transcript...")
     
     try:
-        with open("conversation.json", "r", encoding="utf-8") as file:
+        with open(path, "r", encoding="utf-8") as file:
             data = json.load(file)
  
-        conversation = validate_json_structure(data)
- 
-        print("Generating analysis report...")
-        report = generate_analysis_report(conversation)
-        return report
+        validate_json_structure(data)
+        return analyze_meeting(data)
  
        
  
@@ -1,4 +1,5 @@
 import warnings
+import re
 import logging
 import os
 import azure.functions as func
@@ -6,11 +7,29 @@ import tempfile
 import subprocess
 import json
 import uuid
+import time
+import wave
+from contextlib import nullcontext
+from functools import partial
+import numpy as np
 import whisper
-import torch
 import openai
 from openai import OpenAI
 from concurrent.futures import ThreadPoolExecutor
+from . import config
+from .config import SAMPLE_RATE
+from .model_registry import ModelRegistry
+from .uploads import save_upload, remove_files
+from .parallel import can_transcribe_in_parallel, iter_transcribed_windows, shutdown_pool, transcribe_in_segments
+from .transcript_cache import TranscriptCache, cache_key, hash_audio
+from .jobs import JobStore, JobRunner
+from .windowing import split_into_windows
+from .vad import remove_silence, restore_timestamps
+from .timings import StageTimer, StageMetrics, server_timing_header
+from .batch import resolve_manifest
+from .streaming import OrderedEntries, iter_json_array_items
+from .scheduler import CpuScheduler, available_cores
+from .model_policy import ModelPolicy
 
 # Suppress specific FutureWarning from torch
 warnings.filterwarnings("ignore", category=FutureWarning, module="whisper")
@@ -18,40 +37,200 @@ warnings.filterwarnings("ignore", category=FutureWarning, module="whisper")
 # Set your OpenAI API key
 openai.api_key = os.environ.get("OPENAI_API_KEY")
 
-def transcribe_audio_with_whisper(model, audio_path):
+# Whisper models stay loaded for the lifetime of the worker instead of being reloaded per request
+model_registry = ModelRegistry(
+    memory_budget_bytes=config.WHISPER_MEMORY_BUDGET_MB * 1024 ** 2, backend=config.TRANSCRIPTION_BACKEND
+)
+# The segment workers forked from an evicted model would otherwise keep its weights alive
+model_registry.eviction_listeners.append(shutdown_pool)
+model_registry.preload(config.WHISPER_PRELOAD_MODELS, quantize=config.WHISPER_INT8)
+
+# Chooses the model size per request when MODEL_SELECTION is "auto"
+model_policy = ModelPolicy(model_registry, config.AUTO_MODEL_CANDIDATES)
+
+# Re-uploads of the same recording reuse the stored transcript and labeled dialog
+transcript_cache = TranscriptCache(config.TRANSCRIPT_CACHE_DIR, config.TRANSCRIPT_CACHE_MAX_MB * 1024 ** 2)
+
+# Concurrent CPU transcriptions share the cores instead of each starting a thread per core
+cpu_scheduler = CpuScheduler(
+    cores=available_cores()[:config.CPU_SCHEDULER_CORES] if config.CPU_SCHEDULER_CORES else None,
+    max_jobs=config.CPU_SCHEDULER_MAX_JOBS,
+    min_threads=config.CPU_SCHEDULER_MIN_THREADS,
+    max_threads=config.CPU_SCHEDULER_MAX_THREADS,
+    affinity=config.CPU_AFFINITY,
+)
+
+# Stage timings of every request processed by this worker, exposed at /api/process_file_api/metrics
+stage_metrics = StageMetrics()
+
+def extract_audio_to_wav(video_path, audio_path):
+    # Convert the video file to mono WAV using ffmpeg
+    ffmpeg_command = [
+        "ffmpeg", "-i", video_path, "-vn",
+        "-acodec", "pcm_s16le", "-ar", "44100", "-ac", "1", audio_path
+    ]
+    logging.info(f"Full ffmpeg command: {' '.join(ffmpeg_command)}")
+    logging.info("Starting ffmpeg command...")
+    subprocess.run(ffmpeg_command, check=True, capture_output=True)
+    logging.info("Audio track converted to WAV format.")
+    return audio_path
+
+def extract_audio_samples(video_path):
+    # Decode the audio track straight to 16 kHz mono float32 samples over a pipe
+    ffmpeg_command = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-i", video_path, "-vn",
+        "-f", "f32le", "-acodec", "pcm_f32le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-"
+    ]
+    logging.info(f"Full ffmpeg command: {' '.join(ffmpeg_command)}")
+    logging.info("Starting ffmpeg command...")
+    # stderr goes to a temporary file: a second pipe fills up on damaged input and blocks ffmpeg
+    # while stdout is still being read
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=stderr_file)
+        buffer = bytearray()
+        while chunk := process.stdout.read(1024 * 1024):
+            buffer += chunk
+        if process.wait() != 0:
+            stderr_file.seek(0)
+            raise subprocess.CalledProcessError(process.returncode, ffmpeg_command, stderr=stderr_file.read())
+    # A bytearray keeps the samples writable, so torch can wrap them without another copy
+    audio = np.frombuffer(buffer, dtype=np.float32)
+    logging.info(f"Audio track decoded in memory ({len(audio) / SAMPLE_RATE:.1f}s of audio).")
+    return audio
+
+def audio_duration(audio):
+    # Length in seconds of 16 kHz samples or of the WAV file written by extract_audio_to_wav
+    if isinstance(audio, np.ndarray):
+        return len(audio) / SAMPLE_RATE
+    with wave.open(audio, "rb") as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
+def compact_segments(segments):
+    # Keep only what the labeling step and the Dialog need from Whisper's segments
+    return [
+        {"id": index, "start": round(segment["start"], 2), "end": round(segment["end"], 2), "text": segment["text"].strip()}
+        for index, segment in enumerate(segments)
+        if segment["text"].strip()
+    ]
+
+def cpu_slot(model, exclusive=False):
+    # GPU transcriptions do not compete for CPU cores
+    return cpu_scheduler.slot(exclusive) if model.device.type == "cpu" else nullcontext()
+
+def transcribe_audio_with_whisper(model, audio, offset_map=None, timer=None):
+    # `audio` is either a path to an audio file or a 16 kHz float32 NumPy array
+    # `offset_map` maps timestamps back to the original recording when silence was removed beforehand
+    # The "whisper" stage of `timer` only covers transcription; waiting for CPU cores is the "queue" stage
+    timer = timer or StageTimer()
     try:
         logging.info("Starting transcription with Whisper...")
-        result = model.transcribe(
-            audio_path,
-            no_speech_threshold=0.1,
-            logprob_threshold=-1.0,
-            condition_on_previous_text=True
-        )
-        full_text = result.get("text", "")
+        # Long CPU recordings are split at silences and transcribed by several worker processes
+        if isinstance(audio, np.ndarray) and can_transcribe_in_parallel(model):
+            # The segment workers divide the cores between themselves, so they need the whole machine
+            with timer.wait_for(cpu_slot(model, exclusive=True)) as cores, timer.stage("whisper"):
+                result = transcribe_in_segments(model, audio, cores=cores)
+        else:
+            with timer.wait_for(cpu_slot(model)), timer.stage("whisper"):
+                result = model.transcribe(audio, **config.WHISPER_TRANSCRIBE_OPTIONS)
+        segments = restore_timestamps(compact_segments(result.get("segments", [])), offset_map)
+        transcript = {"text": result.get("text", ""), "segments": segments}
         logging.info("Transcription completed.")
-        return full_text
+        return transcript
     except Exception as e:
         logging.error(f"Error during transcription: {str(e)}")
         raise
 
-def analyze_text_with_openai(full_text):
+# Bump whenever a labeling prompt changes so cached dialogs are not reused
+ANALYSIS_PROMPT_VERSION = 3
+
+# Bump whenever the shape of cached transcripts changes
+TRANSCRIPT_CACHE_VERSION = 2
+
+SPEAKER_RULES = (
+    "- If a speaker introduces themselves as a decision-maker, such as a CEO or manager, they are likely the 'Client.'\n"
+    "- The 'Salesperson' typically proposes solutions, asks about challenges, or provides details about products or services.\n"
+    "- The 'Client' often describes problems, asks for clarification, or reacts to the salesperson's statements.\n"
+    "- If there is uncertainty, prefer assigning roles based on context (e.g., the host of the meeting is likely the Client, "
+    "while the visitor is the Salesperson).\n\n"
+)
+
+def context_prompt(context):
+    if not context:
+        return ""
+    return (
+        "For context only, this is how the meeting went just before the part to analyze. "
+        f"Do not include it in your answer:\n{context}\n\n"
+    )
+
+def analysis_prompt(full_text, context=""):
+    # Refined Prompt for OpenAI API Analysis
+    return (
+        "Analyze the following meeting transcript and assign each statement to either the 'Client' or the 'Salesperson' "
+        "based on the content and context of the statement. Use the following rules to determine the roles:\n\n"
+        f"{SPEAKER_RULES}"
+        "Provide the analysis in JSON format as an array, where each statement includes the fields 'Speaker' (Client or Salesperson), "
+        "'Statement' (the text of the statement), and 'Sentiment' (Positive, Neutral, or Negative). "
+        "Do not include any other text, commentary, or explanation, and do not put it in a code block—only the JSON.\n\n"
+        f"{context_prompt(context)}"
+        f"Transcript:\n{full_text}"
+    )
+
+def analyze_text_with_openai(full_text, context=""):
     try:
         logging.info("Sending transcription to OpenAI for analysis...")
         client = OpenAI(api_key = openai.api_key)
 
-        # Refined Prompt for OpenAI API Analysis
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {"role": "user","content": analysis_prompt(full_text, context)},
+            ],
+        )
+        response_message = response.choices[0].message.content.strip()
+        logging.info("OpenAI analysis completed.")
+        return response_message
+    except Exception as e:
+        logging.error(f"Error during OpenAI analysis: {str(e)}")
+        raise
+
+def stream_analysis_with_openai(full_text, context=""):
+    # Same analysis as analyze_text_with_openai, yielding the completion text as it is generated
+    try:
+        logging.info("Streaming transcription analysis from OpenAI...")
+        client = OpenAI(api_key = openai.api_key)
+
+        stream = client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {"role": "user","content": analysis_prompt(full_text, context)},
+            ],
+            stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        logging.info("OpenAI analysis stream completed.")
+    except Exception as e:
+        logging.error(f"Error during OpenAI analysis: {str(e)}")
+        raise
+
+def label_segments_with_openai(segments, context_segments=()):
+    # Ask only for a compact {segment_id: [speaker, sentiment]} mapping instead of the whole transcript back
+    try:
+        logging.info(f"Sending {len(segments)} transcript segments to OpenAI for labeling...")
+        client = OpenAI(api_key = openai.api_key)
+        numbered_segments = "\n".join(f"{segment['id']}: {segment['text']}" for segment in segments)
+        context = "\n".join(segment["text"] for segment in context_segments)
+
         prompt = (
-            "Analyze the following meeting transcript and assign each statement to either the 'Client' or the 'Salesperson' "
-            "based on the content and context of the statement. Use the following rules to determine the roles:\n\n"
-            "- If a speaker introduces themselves as a decision-maker, such as a CEO or manager, they are likely the 'Client.'\n"
-            "- The 'Salesperson' typically proposes solutions, asks about challenges, or provides details about products or services.\n"
-            "- The 'Client' often describes problems, asks for clarification, or reacts to the salesperson's statements.\n"
-            "- If there is uncertainty, prefer assigning roles based on context (e.g., the host of the meeting is likely the Client, "
-            "while the visitor is the Salesperson).\n\n"
-            "Provide the analysis in JSON format as an array, where each statement includes the fields 'Speaker' (Client or Salesperson), "
-            "'Statement' (the text of the statement), and 'Sentiment' (Positive, Neutral, or Negative). "
-            "Do not include any other text, commentary, or explanation, and do not put it in a code block—only the JSON.\n\n"
-            f"Transcript:\n{full_text}"
+            "Below are the numbered segments of a meeting transcript. Assign each segment to either the 'Client' or the "
+            "'Salesperson' based on the content and context of the statement. Use the following rules to determine the roles:\n\n"
+            f"{SPEAKER_RULES}"
+            "Return a JSON object mapping every segment number to a two element array of the speaker (Client or Salesperson) "
+            "and the sentiment (Positive, Neutral, or Negative), for example {\"0\": [\"Salesperson\", \"Neutral\"]}. "
+            "Do not repeat the segment text and do not include any other text.\n\n"
+            f"{context_prompt(context)}"
+            f"Segments:\n{numbered_segments}"
         )
 
         response = client.chat.completions.create(
@@ -59,89 +238,574 @@ def analyze_text_with_openai(full_text):
             messages=[
                 {"role": "user","content": prompt},
             ],
+            response_format={"type": "json_object"},
         )
         response_message = response.choices[0].message.content.strip()
-        logging.info("OpenAI analysis completed.")
+        logging.info("OpenAI labeling completed.")
         return response_message
     except Exception as e:
-        logging.error(f"Error during OpenAI analysis: {str(e)}")
+        logging.error(f"Error during OpenAI labeling: {str(e)}")
         raise
 
+def build_dialog_from_labels(segments, labels):
+    # Rebuild the Dialog locally, merging consecutive segments with the same speaker and sentiment
+    dialog = []
+    speaker, sentiment = "Salesperson", "Neutral"
+    for segment in segments:
+        label = labels.get(str(segment["id"])) or [speaker, sentiment]
+        if isinstance(label, str):
+            label = [label]
+        speaker = label[0] if len(label) > 0 else speaker
+        sentiment = label[1] if len(label) > 1 else "Neutral"
+        if dialog and dialog[-1]["Speaker"] == speaker and dialog[-1]["Sentiment"] == sentiment:
+            dialog[-1]["Statement"] += f" {segment['text']}"
+            dialog[-1]["End"] = segment["end"]
+            continue
+        dialog.append({
+            "Speaker": speaker,
+            "Statement": segment["text"],
+            "Sentiment": sentiment,
+            "Start": segment["start"],
+            "End": segment["end"],
+        })
+    return dialog
+
+def normalize_statement(text):
+    # Case, punctuation and spacing differ between a statement and the segment it was taken from
+    return " ".join(re.sub(r"[^\w\s]", " ", str(text).lower()).split())
+
+def overlap_statements(context_segments):
+    # Every run of consecutive context segments, since one statement may span several segments
+    texts = [normalize_statement(segment["text"]) for segment in context_segments]
+    return {
+        " ".join(text for text in texts[start:end] if text)
+        for start in range(len(texts)) for end in range(start + 1, len(texts) + 1)
+    } - {""}
+
+def repeats_overlap(entry, overlap):
+    # Only a statement that is a whole context segment (or run of them) is a repeat,
+    # not a short one such as "Yes." that merely occurs somewhere in the context
+    return normalize_statement(entry.get("Statement", "")) in overlap
+
+def label_window(window, on_entry=None):
+    # Labels one window, retrying it on its own when OpenAI does not return valid JSON
+    # With `on_entry`, the Dialog entries are parsed from a streamed completion and passed on as each one completes,
+    # tagged with this window's key and the attempt; before a retry, on_entry(None) retracts what the failed attempt sent
+    context = " ".join(segment["text"] for segment in window["context"])
+    overlap = overlap_statements(window["context"])
+    key = uuid.uuid4().hex
+    dialog = []
+    for attempt in range(config.LABELING_RETRIES + 1):
+        try:
+            if on_entry is not None:
+                if dialog:
+                    on_entry(None, window=key, attempt=attempt)
+                text = " ".join(segment["text"] for segment in window["segments"])
+                dialog = []
+                for entry in iter_json_array_items(stream_analysis_with_openai(text, context)):
+                    # Drop statements repeated from the overlap at the start of the window
+                    if not dialog and repeats_overlap(entry, overlap):
+                        continue
+                    dialog.append(entry)
+                    on_entry(entry, window=key, attempt=attempt)
+                return dialog
+            if config.LABELING_MODE == "segments":
+                labels = json.loads(label_segments_with_openai(window["segments"], window["context"]))
+                # Only keep labels for the segments this window owns, the overlap belongs to the previous window
+                owned = {str(segment["id"]) for segment in window["segments"]}
+                return {key: value for key, value in labels.items() if key in owned}
+            text = " ".join(segment["text"] for segment in window["segments"])
+            dialog = parse_dialog(analyze_text_with_openai(text, context))
+            # Drop statements repeated from the overlap at the start of the window
+            while dialog and repeats_overlap(dialog[0], overlap):
+                dialog.pop(0)
+            return dialog
+        except json.JSONDecodeError as e:
+            if attempt == config.LABELING_RETRIES:
+                raise
+            logging.warning(f"Invalid JSON for labeling window (attempt {attempt + 1}), retrying: {str(e)}")
+
+def label_transcript(transcript, on_entry=None):
+    # Returns the labeled Dialog for a {"text", "segments"} transcript using the configured labeling mode
+    # `on_entry` is called with every Dialog entry in order, while labeling is still running when streaming is enabled
+    segments = transcript["segments"]
+    if not segments:
+        dialog = parse_dialog(analyze_text_with_openai(transcript["text"])) if transcript["text"].strip() else []
+        emit_entries(dialog, on_entry)
+        return dialog
+
+    windows = split_into_windows(segments, config.LABELING_WINDOW_TOKENS, config.LABELING_OVERLAP_TOKENS)
+    streaming = on_entry is not None and config.STREAM_LABELING and config.LABELING_MODE == "transcript"
+    ordered = OrderedEntries(on_entry) if streaming else None
+
+    def label(index):
+        try:
+            return label_window(windows[index], partial(ordered.add, index) if streaming else None)
+        finally:
+            if streaming:
+                ordered.finish(index)
+
+    if len(windows) == 1:
+        results = [label(0)]
+    else:
+        logging.info(f"Labeling the transcript in {len(windows)} windows...")
+        with ThreadPoolExecutor(max_workers=config.LABELING_CONCURRENCY) as executor:
+            results = list(executor.map(label, range(len(windows))))
+
+    if config.LABELING_MODE == "segments":
+        labels = {}
+        for window_labels in results:
+            labels.update(window_labels)
+        dialog = build_dialog_from_labels(segments, labels)
+    else:
+        dialog = [entry for window_dialog in results for entry in window_dialog]
+    if not streaming:
+        emit_entries(dialog, on_entry)
+    return dialog
+
+def emit_entries(dialog, on_entry):
+    if on_entry is not None:
+        for entry in dialog:
+            on_entry(entry)
+
+def parse_dialog(analysis):
+    # Check if the response is already a valid Python list
+    if isinstance(analysis, list):
+        return analysis  # Use it directly
+    # Attempt to parse the response as JSON
+    return json.loads(analysis)
+
+def transcribe_and_label_pipelined(model, audio, executor, offset_map=None, timer=None, on_entry=None, on_progress=None):
+    # Each transcribed window is labeled by OpenAI while Whisper moves on to the next one
+    # Labeling overlaps transcription, so the "openai" stage only counts the wait after Whisper is done
+    # `on_progress` receives the transcribed fraction of the audio after every window
+    timer = timer or StageTimer()
+    ordered = OrderedEntries(on_entry) if on_entry is not None else None
+    if not isinstance(audio, np.ndarray):
+        audio = whisper.load_audio(audio)
+    windows = []
+    futures = []
+    with timer.wait_for(cpu_slot(model, exclusive=can_transcribe_in_parallel(model))) as cores, timer.stage("whisper"):
+        for text, segments in iter_transcribed_windows(
+            model, audio, segment_seconds=config.PIPELINE_WINDOW_SECONDS, cores=cores
+        ):
+            window = {"text": text, "segments": restore_timestamps(compact_segments(segments), offset_map)}
+            windows.append(window)
+            if on_progress:
+                on_progress(min(1.0, len(windows) * config.PIPELINE_WINDOW_SECONDS * SAMPLE_RATE / max(len(audio), 1)))
+            if text:
+                index = len(futures)
+                future = executor.submit(label_transcript, window, partial(ordered.add, index) if ordered else None)
+                if ordered:
+                    future.add_done_callback(lambda _, index=index: ordered.finish(index))
+                futures.append(future)
+    logging.info("Transcription completed, waiting for the remaining analysis windows...")
+
+    dialog = []
+    with timer.stage("openai"):
+        for future in futures:
+            dialog.extend(future.result())
+    transcript = {
+        "text": " ".join(window["text"] for window in windows if window["text"]),
+        "segments": compact_segments([segment for window in windows for segment in window["segments"]]),
+    }
+    return transcript, dialog
+
+def job_status(job):
+    return {
+        "JobId": job["id"],
+        "Status": job["status"],
+        "Stage": job["stage"],
+        "Progress": job["progress"],
+        "Error": job["error"],
+        "StatusUrl": f"/api/process_file_api/jobs/{job['id']}",
+        "ResultUrl": f"/api/process_file_api/jobs/{job['id']}/result",
+        "DialogUrl": f"/api/process_file_api/jobs/{job['id']}/dialog",
+    }
+
+def handle_jobs_request(req):
+    job_id = req.route_params.get("job_id")
+    detail = req.route_params.get("detail")
+
+    # POST /jobs queues the upload and returns immediately
+    if req.method == "POST" and not job_id:
+        options, error_response = request_options(req)
+        if error_response:
+            return error_response
+        video_path, error_response = save_request_file(req, JOB_UPLOADS_DIR)
+        if error_response:
+            return error_response
+        job_id = job_store.create(video_path, options)
+        job_runner.start()
+        job_runner.notify()
+        logging.info(f"Queued job {job_id}.")
+        return func.HttpResponse(json.dumps(job_status(job_store.get(job_id))), status_code=202, mimetype="application/json")
+
+    if req.method != "GET" or not job_id or detail not in (None, "result", "dialog"):
+        return func.HttpResponse("Not found.", status_code=404)
+
+    job = job_store.get(job_id)
+    if job is None:
+        return func.HttpResponse(f"Job {job_id} not found.", status_code=404)
+
+    # GET /jobs/<id>/dialog?after=N&revision=R returns the Dialog entries labeled so far as NDJSON, starting at entry N
+    # A window that is labeled again takes its entries back; when that happened since revision R the entries start
+    # earlier, at X-Dialog-Reset, and replace the ones the caller has from there on
+    if detail == "dialog":
+        try:
+            after = int(req.params.get("after", 0))
+            revision = int(req.params.get("revision", 0))
+        except ValueError:
+            return func.HttpResponse("The after and revision parameters must be integers.", status_code=400)
+        entries, start, revision = job_store.get_entries(job_id, after, revision)
+        headers = {"X-Job-Status": job["status"], "X-Next-Entry": str(start + len(entries)), "X-Dialog-Revision": str(revision)}
+        if start < after:
+            headers["X-Dialog-Reset"] = str(start)
+        return func.HttpResponse(
+            "".join(json.dumps(entry) + "\n" for entry in entries), status_code=200, mimetype="application/x-ndjson",
+            headers=headers
+        )
+
+    # GET /jobs/<id>/result returns the Meeting JSON once the job has completed
+    if detail == "result":
+        if job["status"] == "completed":
+            return func.HttpResponse(job["result"], status_code=200, mimetype="application/json")
+        if job["status"] == "failed":
+            return func.HttpResponse(job["error"], status_code=500)
+        return func.HttpResponse(json.dumps(job_status(job)), status_code=202, mimetype="application/json")
+
+    return func.HttpResponse(json.dumps(job_status(job)), status_code=200, mimetype="application/json")
+
+class ProcessingError(Exception):
+    # Raised with the message returned to the caller when a processing stage fails
+    pass
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("Python HTTP trigger function processed a request.")
+    timer = StageTimer()
+
+    # Asynchronous jobs live under /api/process_file_api/jobs
+    if req.route_params.get("action") == "jobs":
+        return handle_jobs_request(req)
+    if req.route_params.get("action") == "metrics" and req.method == "GET":
+        return handle_metrics_request()
+    if req.route_params.get("action") == "batch":
+        return handle_batch_request(req)
+    if req.route_params.get("action"):
+        return func.HttpResponse("Not found.", status_code=404)
+    if req.method != "POST":
+        return func.HttpResponse("Method not allowed.", status_code=405)
+
+    options, error_response = request_options(req)
+    if error_response:
+        return error_response
+    with timer.stage("upload"):
+        temp_file_path, error_response = save_request_file(req)
+    if error_response:
+        return error_response
+
+    try:
+        return process_video(temp_file_path, timer, options)
+    finally:
+        remove_files(temp_file_path)
+
+def request_options(req):
+    # Optional "model" and "latency_budget" from the query string or form fields, checked before the upload is saved
+    options = {}
+    model_name = req.params.get("model") or req.form.get("model")
+    if model_name:
+        allowed = set(config.AUTO_MODEL_CANDIDATES) | set(config.WHISPER_PRELOAD_MODELS) | {config.WHISPER_MODEL}
+        if model_name not in allowed:
+            return None, func.HttpResponse(f"Unknown model '{model_name}', expected one of {sorted(allowed)}.", status_code=400)
+        options["model"] = model_name
+    latency_budget = req.params.get("latency_budget") or req.form.get("latency_budget")
+    if latency_budget:
+        try:
+            options["latency_budget"] = float(latency_budget)
+        except ValueError:
+            return None, func.HttpResponse("The latency_budget parameter must be a number of seconds.", status_code=400)
+        if options["latency_budget"] <= 0:
+            return None, func.HttpResponse("The latency_budget parameter must be positive.", status_code=400)
+    return options, None
+
+def choose_model(audio_seconds, options):
+    # Returns the model to transcribe with and a description of how it was chosen for the response
+    choice = {"AudioSeconds": round(audio_seconds, 2)}
+    if options.get("model"):
+        choice.update(Name=options["model"], Selection="override")
+    elif config.MODEL_SELECTION == "auto":
+        budget = options.get("latency_budget", config.LATENCY_BUDGET_SECONDS)
+        name, expected = model_policy.select(audio_seconds, budget, model_registry.device, config.WHISPER_INT8)
+        choice.update(Name=name, Selection="auto", BudgetSeconds=budget, EstimatedSeconds=round(expected, 1))
+    else:
+        choice.update(Name=config.WHISPER_MODEL, Selection="fixed")
+    return choice
 
+def save_request_file(req, directory=None):
     # Check if the request contains a file
     try:
         file = req.files.get('file')
         if not file:
-            return func.HttpResponse("No file found in the request. Please upload a video file.", status_code=400)
+            return None, func.HttpResponse("No file found in the request. Please upload a video or audio file.", status_code=400)
     except Exception as e:
         logging.error(f"Error while reading the file from request: {str(e)}")
-        return func.HttpResponse(f"Error while reading the file from request: {str(e)}", status_code=500)
+        return None, func.HttpResponse(f"Error while reading the file from request: {str(e)}", status_code=500)
+
+    # Stream the uploaded file to a unique temporary location in fixed-size chunks
+    try:
+        temp_file_path = save_upload(file, directory)
+    except Exception as e:
+        logging.error(f"Error while saving the uploaded file: {str(e)}")
+        return None, func.HttpResponse(f"Error while saving the uploaded file: {str(e)}", status_code=500)
+    logging.info(f"File saved to temporary location {temp_file_path}.")
+    return temp_file_path, None
+
+def handle_metrics_request():
+    # Percentiles and histograms of the stage timings, plus the state of the model registry and cache
+    metrics = stage_metrics.snapshot()
+    metrics["model_registry"] = model_registry.stats()
+    metrics["transcript_cache"] = transcript_cache.stats()
+    metrics["cpu_scheduler"] = cpu_scheduler.stats()
+    metrics["real_time_factors"] = model_policy.stats()
+    return func.HttpResponse(json.dumps(metrics), status_code=200, mimetype="application/json")
+
+def batch_status(batch_id, counts):
+    files = sum(counts.values())
+    finished = counts.get("completed", 0) + counts.get("failed", 0)
+    return {
+        "BatchId": batch_id,
+        "Status": "completed" if finished == files else "running",
+        "Files": files,
+        "Queued": counts.get("queued", 0),
+        "Running": counts.get("running", 0),
+        "Completed": counts.get("completed", 0),
+        "Failed": counts.get("failed", 0),
+        "StatusUrl": f"/api/process_file_api/batch/{batch_id}",
+        "ResultsUrl": f"/api/process_file_api/batch/{batch_id}/results",
+    }
+
+def batch_result(job):
+    result = {"File": job["name"], "JobId": job["id"], "Status": job["status"]}
+    if job["status"] == "completed":
+        result["Result"] = json.loads(job["result"])
+    else:
+        result["Error"] = job["error"]
+    return result
+
+def handle_batch_request(req):
+    batch_id = req.route_params.get("job_id")
+    detail = req.route_params.get("detail")
+    if req.method == "POST" and not batch_id:
+        return queue_batch(req)
+    if req.method != "GET" or not batch_id or detail not in (None, "results"):
+        return func.HttpResponse("Not found.", status_code=404)
+
+    counts = job_store.get_batch(batch_id)
+    if counts is None:
+        return func.HttpResponse(f"Batch {batch_id} not found.", status_code=404)
+    status = batch_status(batch_id, counts)
+    if detail is None:
+        return func.HttpResponse(json.dumps(status), status_code=200, mimetype="application/json")
+
+    # GET /batch/<id>/results?after=N returns the files finished so far as NDJSON in the order they finished,
+    # starting at the Nth, so a client polls with the X-Next-Entry of the previous response until the batch completes
+    try:
+        after = int(req.params.get("after", 0))
+    except ValueError:
+        return func.HttpResponse("The after parameter must be an integer.", status_code=400)
+    results = [batch_result(job) for job in job_store.get_batch_results(batch_id, after)]
+    return func.HttpResponse(
+        "".join(json.dumps(result) + "\n" for result in results), status_code=200, mimetype="application/x-ndjson",
+        headers={"X-Batch-Status": status["Status"], "X-Next-Entry": str(after + len(results))}
+    )
+
+def queue_batch(req):
+    # POST /batch takes several uploaded files, or a JSON manifest {"paths": [...]} of files under BATCH_MANIFEST_ROOT
+    # Every file is queued as a job for the job workers and the batch ID is returned right away
+    options, error_response = request_options(req)
+    if error_response:
+        return error_response
+    uploaded_paths = []
+    try:
+        files = req.files.getlist("file") if req.files else []
+        if files:
+            if len(files) > config.BATCH_MAX_FILES:
+                return func.HttpResponse(f"Too many files in one batch, the limit is {config.BATCH_MAX_FILES}.", status_code=413)
+            items = []
+            for file in files:
+                path = save_upload(file, JOB_UPLOADS_DIR)
+                uploaded_paths.append(path)
+                items.append((file.filename or os.path.basename(path), path))
+        else:
+            try:
+                manifest = req.get_json()
+                paths = manifest["paths"]
+                if not isinstance(paths, list) or not paths:
+                    raise ValueError("paths must be a non-empty list of file paths")
+                if len(paths) > config.BATCH_MAX_FILES:
+                    return func.HttpResponse(
+                        f"Too many files in one batch, the limit is {config.BATCH_MAX_FILES}.", status_code=413
+                    )
+                items = list(zip(paths, resolve_manifest(paths, config.BATCH_MANIFEST_ROOT)))
+            except (ValueError, KeyError, TypeError) as e:
+                logging.error(f"Invalid batch request: {str(e)}")
+                return func.HttpResponse(
+                    f"Invalid batch request, upload files or send a manifest of paths: {str(e)}", status_code=400
+                )
+
+        # Uploaded copies are removed by the workers once processed, manifest files belong to the caller
+        batch_id = job_store.create_batch(items, options, keep_files=not uploaded_paths)
+        uploaded_paths = []
+    finally:
+        remove_files(*uploaded_paths)
+    job_runner.start()
+    for _ in range(min(len(items), config.JOB_WORKERS)):
+        job_runner.notify()
+    logging.info(f"Queued batch {batch_id} of {len(items)} files.")
+    return func.HttpResponse(
+        json.dumps(batch_status(batch_id, job_store.get_batch(batch_id))), status_code=202, mimetype="application/json"
+    )
+
+def process_video(temp_file_path, timer=None, options=None):
+    timer = timer or StageTimer()
+    try:
+        response_data = process_video_file(temp_file_path, timer=timer, options=options)
+    except ProcessingError as e:
+        return func.HttpResponse(str(e), status_code=500, headers={"Server-Timing": server_timing_header(timer.as_dict())})
+    return func.HttpResponse(
+        json.dumps(response_data), status_code=200, mimetype="application/json",
+        headers={"Server-Timing": server_timing_header(response_data["Timings"])}
+    )
 
-    # Save the uploaded file to a temporary location
-    temp_file_path = os.path.join(tempfile.gettempdir(), file.filename)
-    with open(temp_file_path, "wb") as temp_file:
-        temp_file.write(file.read())
-    logging.info("File saved to temporary location.")
+def process_video_file(temp_file_path, report_stage=None, timer=None, report_entry=None, options=None):
+    # Runs the whole pipeline for a saved video and returns the Meeting JSON, raising ProcessingError on failure
+    # `options` holds the per-request "model" override and "latency_budget" from request_options
+    # `report_entry` receives each Dialog entry in order as soon as it is labeled, or None with the window key when
+    # a window that is labeled again takes back the entries it reported
+    report_stage = report_stage or (lambda stage, progress: None)
+    timer = timer or StageTimer()
 
     # Generate a unique file name for the audio output
     unique_id = uuid.uuid4().hex
     temp_audio_path = os.path.join(tempfile.gettempdir(), f"audio_{unique_id}.wav")
+    try:
+        response_data = _process_video_file(
+            temp_file_path, temp_audio_path, timer, report_stage, report_entry, options or {}
+        )
+    except ProcessingError:
+        stage_metrics.record(timer.as_dict(), failed=True)
+        raise
+    finally:
+        remove_files(temp_audio_path)
+    stage_metrics.record(response_data["Timings"])
+    return response_data
 
-    # Convert the video file to mono WAV using ffmpeg
-    ffmpeg_command = [
-        "ffmpeg", "-i", temp_file_path, "-vn",
-        "-acodec", "pcm_s16le", "-ar", "44100", "-ac", "1", temp_audio_path
-    ]
-    logging.info(f"Full ffmpeg command: {' '.join(ffmpeg_command)}")
-
+def _process_video_file(temp_file_path, temp_audio_path, timer, report_stage, report_entry=None, options=None):
+    options = options or {}
+    # Extract the audio track, either in memory or through a temporary WAV file
+    report_stage("extracting", 5)
     try:
-        logging.info("Starting ffmpeg command...")
-        subprocess.run(ffmpeg_command, check=True, capture_output=True)
-        logging.info("Audio track converted to WAV format.")
+        with timer.stage("ffmpeg"):
+            if config.AUDIO_PIPELINE == "file":
+                audio = extract_audio_to_wav(temp_file_path, temp_audio_path)
+            else:
+                audio = extract_audio_samples(temp_file_path)
     except subprocess.CalledProcessError as e:
         logging.error(f"Error while converting video to audio: {e.stderr}")
-        return func.HttpResponse(f"Error while converting video to audio: {e.stderr}", status_code=500)
+        raise ProcessingError(f"Error while converting video to audio: {e.stderr}")
 
-    # Check CUDA availability
-    if torch.cuda.is_available():
-        logging.info(f"Using CUDA: {torch.cuda.get_device_name(0)}")
-        device = "cuda"
-    else:
-        logging.warning("CUDA is not available. Using CPU instead.")
-        device = "cpu"
+    # Pick the model size from the length of the recording, unless the request asked for one
+    model_choice = choose_model(audio_duration(audio), options)
+    model_name = model_choice["Name"]
 
-    # Load the Whisper model with the appropriate device
-    model = whisper.load_model("large", device=device)
+    # Identical audio, model and prompt versions map to the same cache entries
+    with timer.stage("hash"):
+        audio_hash = hash_audio(audio)
+    vad_settings = (
+        [config.VAD_MARGIN_DB, config.VAD_MIN_LEVEL_DB, config.VAD_MIN_SILENCE_SECONDS, config.VAD_PADDING_SECONDS]
+        if config.VAD_ENABLED else None
+    )
+    transcript_key = cache_key(
+        audio_hash, config.TRANSCRIPTION_BACKEND, model_name, config.WHISPER_INT8,
+        config.WHISPER_TRANSCRIBE_OPTIONS, vad_settings, TRANSCRIPT_CACHE_VERSION
+    )
+    dialog_key = cache_key(transcript_key, "gpt-4o", config.LABELING_MODE, ANALYSIS_PROMPT_VERSION)
+    with timer.stage("cache"):
+        dialog = transcript_cache.get(dialog_key)
+        transcript = transcript_cache.get(transcript_key) if dialog is None else None
 
-    # Run transcription and OpenAI analysis concurrently
-    try:
-        with ThreadPoolExecutor() as executor:
-            future_transcription = executor.submit(transcribe_audio_with_whisper, model, temp_audio_path)
-            full_text = future_transcription.result()
+    start_kind = "cached"
+    model_seconds = 0.0
+    if dialog is None and transcript is None:
+        # Fetch the resident Whisper model, loading it only if this worker has not done so yet
+        report_stage("loading_model", 15)
+        model_start = time.perf_counter()
+        cold_start = model_registry.misses
+        try:
+            with timer.stage("model"):
+                model = model_registry.get(model_name, quantize=config.WHISPER_INT8)
+        except Exception as e:
+            logging.error(f"Error while loading the Whisper model: {str(e)}")
+            raise ProcessingError(f"Error while loading the Whisper model: {str(e)}")
+        model_seconds = time.perf_counter() - model_start
+        start_kind = "cold" if model_registry.misses > cold_start else "warm"
+        logging.info(f"Whisper model '{model_name}' ready in {model_seconds:.2f}s ({start_kind} start).")
 
-            future_analysis = executor.submit(analyze_text_with_openai, full_text)
-            analysis = future_analysis.result()
+    # Drop silence and quiet stretches before Whisper, keeping an offset map to restore timestamps
+    offset_map = None
+    vad_stats = None
+    if dialog is None and transcript is None and config.VAD_ENABLED:
+        with timer.stage("vad"):
+            if not isinstance(audio, np.ndarray):
+                audio = whisper.load_audio(audio)
+            audio, offset_map, vad_stats = remove_silence(audio)
+        logging.info(
+            f"Voice activity detection skipped {vad_stats['SkippedSeconds']:.1f}s of "
+            f"{vad_stats['OriginalSeconds']:.1f}s ({vad_stats['SkippedRatio']:.0%})."
+        )
 
-        logging.info("Transcription and analysis completed.")
+    # Run transcription and OpenAI analysis concurrently
+    try:
+        if dialog is None:
+            with ThreadPoolExecutor() as executor:
+                if transcript is None and config.PIPELINED_LABELING:
+                    report_stage("transcribing", 25)
+                    transcript, dialog = transcribe_and_label_pipelined(
+                        model, audio, executor, offset_map, timer, report_entry,
+                        lambda fraction: report_stage("transcribing", 25 + int(45 * fraction))
+                    )
+                    transcript_cache.put(transcript_key, transcript)
+                    # The "whisper" stage ends with the last window, labeling that is still running is not part of it
+                    model_policy.record(model_name, model.device.type, audio_duration(audio), timer.durations["whisper"])
+                else:
+                    if transcript is None:
+                        report_stage("transcribing", 25)
+                        future_transcription = executor.submit(
+                            transcribe_audio_with_whisper, model, audio, offset_map, timer
+                        )
+                        transcript = future_transcription.result()
+                        transcript_cache.put(transcript_key, transcript)
+                        # Measured speed feeds the automatic model selection; time spent queued is not part of it
+                        model_policy.record(model_name, model.device.type, audio_duration(audio), timer.durations["whisper"])
 
-        # Validate the analysis response
-        try:
-            # Check if the response is already a valid Python list
-            if isinstance(analysis, list):
-                dialog = analysis  # Use it directly
-            else:
-                # Attempt to parse the response as JSON
-                dialog = json.loads(analysis)
+                    report_stage("analyzing", 70)
+                    with timer.stage("openai"):
+                        future_analysis = executor.submit(label_transcript, transcript, report_entry)
+                        # Validate the analysis response
+                        dialog = future_analysis.result()
 
+            logging.info("Transcription and analysis completed.")
             logging.info(f"Parsed dialog: {dialog}")
-        except json.JSONDecodeError as e:
-            logging.error(f"JSONDecodeError: {str(e)}. Analysis response: {analysis}")
-            return func.HttpResponse("Error: Invalid JSON format returned by OpenAI.", status_code=500)
+            transcript_cache.put(dialog_key, dialog)
+        else:
+            logging.info(f"Using cached transcript and dialog for audio {audio_hash[:12]}.")
+            emit_entries(dialog, report_entry)
 
+    except json.JSONDecodeError as e:
+        logging.error(f"JSONDecodeError: {str(e)}. Analysis response: {e.doc}")
+        raise ProcessingError("Error: Invalid JSON format returned by OpenAI.")
     except Exception as e:
-        return func.HttpResponse(f"Error during processing: {str(e)}", status_code=500)
+        raise ProcessingError(f"Error during processing: {str(e)}")
 
     # Construct the final JSON structure
     response_data = {
@@ -161,5 +825,24 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             }
         }
     }
+    response_data["Processing"] = {"Model": model_choice}
+    if vad_stats:
+        response_data["Processing"]["VoiceActivity"] = vad_stats
+    # Seconds spent in each stage; the same numbers are sent as a Server-Timing header
+    response_data["Timings"] = timer.as_dict()
+
+    report_stage("completed", 100)
+    logging.info(
+        f"Request completed in {timer.total():.2f}s ({start_kind} start, "
+        f"model ready in {model_seconds:.2f}s). Stage timings: {response_data['Timings']}. "
+        f"Model registry: {model_registry.stats()}. "
+        f"Transcript cache: {transcript_cache.stats()}"
+    )
+    return response_data
 
-    return func.HttpResponse(json.dumps(response_data), status_code=200, mimetype="application/json")
+# Asynchronous jobs are queued in SQLite so they survive a worker restart; pending jobs resume at startup
+JOB_UPLOADS_DIR = os.path.join(config.JOBS_DIR, "uploads")
+os.makedirs(JOB_UPLOADS_DIR, exist_ok=True)
+job_store = JobStore(os.path.join(config.JOBS_DIR, "jobs.sqlite3"))
+job_runner = JobRunner(job_store, process_video_file, workers=config.JOB_WORKERS)
+job_runner.start()
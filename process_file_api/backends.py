@@ -0,0 +1,106 @@
+import logging
+
+import torch
+
+from . import config
+
+# Whisper's transcribe() option names that faster-whisper spells differently
+FASTER_WHISPER_OPTION_NAMES = {"logprob_threshold": "log_prob_threshold"}
+
+# Whisper options faster-whisper has no equivalent for
+FASTER_WHISPER_IGNORED_OPTIONS = {"fp16", "verbose"}
+
+
+class TranscriptionBackend:
+    """Loads models whose transcribe() returns Whisper's {"text", "segments", "language"} result."""
+
+    name = None
+
+    def load_model(self, model_name, device, quantize=False):
+        raise NotImplementedError
+
+
+class WhisperBackend(TranscriptionBackend):
+    """The reference openai-whisper implementation running on PyTorch."""
+
+    name = "whisper"
+
+    def load_model(self, model_name, device, quantize=False):
+        from .model_registry import quantize_model
+        from .weight_cache import load_whisper_model
+
+        model = load_whisper_model(model_name, device, config.WHISPER_WEIGHT_CACHE_DIR)
+        return quantize_model(model) if quantize else model
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """CTranslate2 implementation from the faster-whisper package, optimized for CPU inference."""
+
+    name = "faster-whisper"
+
+    def load_model(self, model_name, device, quantize=False):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("The faster-whisper backend needs the faster-whisper package: pip install faster-whisper")
+
+        if quantize:
+            compute_type = "int8"
+        else:
+            compute_type = "float16" if device == "cuda" else "float32"
+        return FasterWhisperModel(WhisperModel(model_name, device=device, compute_type=compute_type), model_name, device, quantize)
+
+
+class FasterWhisperModel:
+    """Gives a faster-whisper model the same transcribe() interface and result schema as openai-whisper."""
+
+    # CTranslate2 runs its own thread pool, which does not survive being forked into segment workers
+    fork_safe = False
+
+    def __init__(self, model, model_name, device, quantize):
+        self.model = model
+        self.model_name = model_name
+        self.device = torch.device(device)
+        self.quantize = quantize
+
+    def size_in_bytes(self):
+        from .model_registry import estimate_model_size
+
+        return estimate_model_size(self.model_name, self.quantize)
+
+    def transcribe(self, audio, **options):
+        kwargs = {}
+        for key, value in options.items():
+            if key in FASTER_WHISPER_IGNORED_OPTIONS:
+                continue
+            kwargs[FASTER_WHISPER_OPTION_NAMES.get(key, key)] = value
+
+        segments, info = self.model.transcribe(audio, **kwargs)
+        result_segments = [
+            {
+                "id": segment.id,
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "avg_logprob": segment.avg_logprob,
+                "no_speech_prob": segment.no_speech_prob,
+            }
+            for segment in segments
+        ]
+        return {
+            "text": "".join(segment["text"] for segment in result_segments),
+            "segments": result_segments,
+            "language": info.language,
+        }
+
+
+BACKENDS = {backend.name: backend for backend in (WhisperBackend, FasterWhisperBackend)}
+
+
+def get_backend(name):
+    """Return the transcription backend registered under a name."""
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        logging.error(f"Unknown transcription backend '{name}', expected one of {sorted(BACKENDS)}.")
+        raise ValueError(f"Unknown transcription backend '{name}'.")
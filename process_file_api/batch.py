@@ -0,0 +1,18 @@
+import os
+
+
+def resolve_manifest(paths, root):
+    """Return the absolute paths of a manifest, refusing any that fall outside root."""
+    if not root:
+        raise ValueError("Batch manifests are disabled, set BATCH_MANIFEST_ROOT to allow them.")
+    root = os.path.realpath(root)
+    resolved = []
+    for path in paths:
+        if not isinstance(path, str) or not path:
+            raise ValueError(f"Invalid manifest entry: {path!r}")
+        full_path = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, full_path]) != root:
+            raise ValueError(f"Manifest entry {path} is outside {root}.")
+        resolved.append(full_path)
+    return resolved
+
@@ -0,0 +1,142 @@
+import os
+import tempfile
+
+
+def _env_list(name, default=""):
+    value = os.environ.get(name, default)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _env_bool(name, default=False):
+    value = os.environ.get(name)
+    return value.strip().lower() in ("1", "true", "yes", "on") if value else default
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+# Whisper works on 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+# Default Whisper model used when the request does not ask for one
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "large")
+
+# Comma separated list of Whisper models loaded when the worker starts, e.g. "large,small"
+WHISPER_PRELOAD_MODELS = _env_list("WHISPER_PRELOAD_MODELS", WHISPER_MODEL)
+
+# Upper bound for the memory held by resident Whisper models, in MB (0 disables the limit)
+WHISPER_MEMORY_BUDGET_MB = _env_int("WHISPER_MEMORY_BUDGET_MB", 0)
+
+# Transcription engine: "whisper" (openai-whisper on PyTorch) or "faster-whisper" (CTranslate2, not in
+# requirements.txt: deployments using it run `pip install faster-whisper`)
+TRANSCRIPTION_BACKEND = os.environ.get("TRANSCRIPTION_BACKEND", "whisper").lower()
+
+# Run Whisper with dynamically quantized int8 linear layers on CPU hosts
+WHISPER_INT8 = _env_bool("WHISPER_INT8")
+
+# How the audio track reaches Whisper: "pipe" decodes to 16 kHz samples in memory, "file" writes a temporary WAV
+AUDIO_PIPELINE = os.environ.get("AUDIO_PIPELINE", "pipe").lower()
+
+# Decoding options shared by every Whisper transcription path
+WHISPER_TRANSCRIBE_OPTIONS = {
+    "no_speech_threshold": 0.1,
+    "logprob_threshold": -1.0,
+    "condition_on_previous_text": True,
+}
+
+# Number of CPU processes transcribing segments of one recording in parallel (1 disables segmenting)
+TRANSCRIBE_WORKERS = _env_int("TRANSCRIBE_WORKERS", 1)
+
+# Torch threads used by each segment worker (0 splits the cores granted to the transcription evenly between workers)
+TRANSCRIBE_THREADS_PER_WORKER = _env_int("TRANSCRIBE_THREADS_PER_WORKER", 0)
+
+# Target length of each segment, the split point is moved to the quietest frame nearby
+TRANSCRIBE_SEGMENT_SECONDS = _env_int("TRANSCRIBE_SEGMENT_SECONDS", 120)
+
+# Directory holding cached transcripts and labeled dialogs, keyed on the audio hash
+TRANSCRIPT_CACHE_DIR = os.environ.get("TRANSCRIPT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "transcript_cache"))
+
+# Size limit of the transcript cache in MB (0 disables the cache)
+TRANSCRIPT_CACHE_MAX_MB = _env_int("TRANSCRIPT_CACHE_MAX_MB", 512)
+
+# Label each transcribed window with GPT-4o while Whisper keeps transcribing the next ones
+PIPELINED_LABELING = _env_bool("PIPELINED_LABELING")
+
+# Length of the windows handed to the labeling call in pipelined mode
+PIPELINE_WINDOW_SECONDS = _env_int("PIPELINE_WINDOW_SECONDS", 300)
+
+# Directory holding the SQLite job queue and the uploads waiting to be processed
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(tempfile.gettempdir(), "process_file_jobs"))
+
+# Background threads processing asynchronous jobs in each worker process
+JOB_WORKERS = _env_int("JOB_WORKERS", 1)
+
+# How GPT-4o labels speakers: "transcript" has it rewrite the transcript as JSON, "segments" only returns labels per Whisper segment
+LABELING_MODE = os.environ.get("LABELING_MODE", "transcript").lower()
+
+# Transcript tokens labeled per GPT-4o call; longer meetings are split into windows
+LABELING_WINDOW_TOKENS = _env_int("LABELING_WINDOW_TOKENS", 6000)
+
+# Tokens of the previous window repeated as read-only context at the start of the next one
+LABELING_OVERLAP_TOKENS = _env_int("LABELING_OVERLAP_TOKENS", 300)
+
+# Labeling windows sent to OpenAI at the same time
+LABELING_CONCURRENCY = _env_int("LABELING_CONCURRENCY", 4)
+
+# Extra attempts for a window whose reply is not valid JSON
+LABELING_RETRIES = _env_int("LABELING_RETRIES", 2)
+
+# Drop silence and other quiet stretches before Whisper runs
+VAD_ENABLED = _env_bool("VAD_ENABLED")
+
+# How far above the recording's noise floor a frame must be to count as speech
+VAD_MARGIN_DB = float(os.environ.get("VAD_MARGIN_DB", "12"))
+
+# Frames quieter than this are never speech, whatever the noise floor
+VAD_MIN_LEVEL_DB = float(os.environ.get("VAD_MIN_LEVEL_DB", "-55"))
+
+# Pauses shorter than this stay in the audio
+VAD_MIN_SILENCE_SECONDS = float(os.environ.get("VAD_MIN_SILENCE_SECONDS", "2.0"))
+
+# Audio kept on both sides of every speech region
+VAD_PADDING_SECONDS = float(os.environ.get("VAD_PADDING_SECONDS", "0.4"))
+
+# Largest number of files accepted by one batch request; every file is queued as a job for the JOB_WORKERS
+BATCH_MAX_FILES = _env_int("BATCH_MAX_FILES", 1000)
+
+# Directory that batch manifests may reference local files in (manifests are rejected when unset)
+BATCH_MANIFEST_ROOT = os.environ.get("BATCH_MANIFEST_ROOT", "")
+
+# Stream the GPT-4o completion and hand each window's Dialog entries on as soon as that window has parsed
+# ("transcript" labeling mode only)
+STREAM_LABELING = _env_bool("STREAM_LABELING")
+
+# Directory of fp32 Whisper weights that worker processes memory-map instead of deserializing (empty disables it)
+WHISPER_WEIGHT_CACHE_DIR = os.environ.get("WHISPER_WEIGHT_CACHE_DIR", "")
+
+# CPU cores shared by concurrent transcriptions (0 uses every core available to the process)
+CPU_SCHEDULER_CORES = _env_int("CPU_SCHEDULER_CORES", 0)
+
+# Transcriptions running at once on the CPU (0 allows as many as get CPU_SCHEDULER_MIN_THREADS cores each)
+# When set, each one gets at most cores / CPU_SCHEDULER_MAX_JOBS threads unless CPU_SCHEDULER_MAX_THREADS says otherwise
+CPU_SCHEDULER_MAX_JOBS = _env_int("CPU_SCHEDULER_MAX_JOBS", 0)
+
+# Fewest and most torch threads given to one transcription (0 for the most means no upper bound)
+# With both CPU_SCHEDULER_MAX_JOBS and CPU_SCHEDULER_MAX_THREADS at 0, a transcription that starts alone takes
+# every core and later ones wait for it to finish, so they effectively run one at a time
+CPU_SCHEDULER_MIN_THREADS = _env_int("CPU_SCHEDULER_MIN_THREADS", 2)
+CPU_SCHEDULER_MAX_THREADS = _env_int("CPU_SCHEDULER_MAX_THREADS", 0)
+
+# Pin each transcription thread to the cores it was given
+CPU_AFFINITY = _env_bool("CPU_AFFINITY")
+
+# How the Whisper model is chosen: "fixed" always uses WHISPER_MODEL, "auto" picks one per request by audio length
+MODEL_SELECTION = os.environ.get("MODEL_SELECTION", "fixed").lower()
+
+# Models "auto" selection chooses from, smallest first
+AUTO_MODEL_CANDIDATES = _env_list("AUTO_MODEL_CANDIDATES", "tiny,base,small,medium,large")
+
+# Time a transcription should finish in, used by "auto" selection unless the request sets latency_budget
+LATENCY_BUDGET_SECONDS = float(os.environ.get("LATENCY_BUDGET_SECONDS", "120"))
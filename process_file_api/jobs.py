@@ -0,0 +1,352 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from .uploads import remove_files
+
+# Running jobs whose worker stopped sending heartbeats for this long are queued again
+STALE_JOB_SECONDS = 120
+
+HEARTBEAT_SECONDS = 30
+
+# A job that keeps taking its worker down is failed after this many attempts
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    video_path TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    heartbeat_at REAL,
+    options TEXT,
+    batch_id TEXT,
+    name TEXT,
+    keep_file INTEGER NOT NULL DEFAULT 0,
+    finished_seq INTEGER
+)
+"""
+
+# Columns added after the jobs table was first created, added to older databases on start
+ADDED_COLUMNS = {
+    "options": "TEXT",
+    "batch_id": "TEXT",
+    "name": "TEXT",
+    "keep_file": "INTEGER NOT NULL DEFAULT 0",
+    "finished_seq": "INTEGER",
+}
+
+# Jobs of a batch are numbered in the order they finish, so its results can be read page by page as they come in
+FINISHED_SEQ = (
+    "CASE WHEN batch_id IS NULL THEN NULL ELSE "
+    "(SELECT COALESCE(MAX(done.finished_seq) + 1, 0) FROM jobs AS done WHERE done.batch_id = jobs.batch_id) END"
+)
+
+# Dialog entries of a job, stored as they are labeled so callers can read them before the job completes
+# Each entry keeps the labeling window and attempt it came from, so a retried window can take its entries back
+ENTRIES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dialog_entries (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    window_key TEXT,
+    attempt INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, seq)
+)
+"""
+
+# Every time stored entries are taken back, the first sequence number removed is recorded under a new revision
+# Entries are numbered again from there, so a reader that is past it has to drop what it read from that point on
+RESETS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dialog_resets (
+    job_id TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (job_id, revision)
+)
+"""
+
+
+class JobStore:
+    """SQLite-backed job queue shared by every worker process on the host."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(SCHEMA)
+            columns = [row["name"] for row in connection.execute("PRAGMA table_info(jobs)")]
+            for column, definition in ADDED_COLUMNS.items():
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+            connection.execute(ENTRIES_SCHEMA)
+            columns = [row["name"] for row in connection.execute("PRAGMA table_info(dialog_entries)")]
+            if "window_key" not in columns:
+                connection.execute("ALTER TABLE dialog_entries ADD COLUMN window_key TEXT")
+                connection.execute("ALTER TABLE dialog_entries ADD COLUMN attempt INTEGER NOT NULL DEFAULT 0")
+            connection.execute(RESETS_SCHEMA)
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id, finished_seq)")
+
+    def _connect(self, immediate=True):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return _Transaction(connection, immediate)
+
+    def create(self, video_path, options=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, status, stage, video_path, options, created_at, updated_at) "
+                "VALUES (?, 'queued', 'queued', ?, ?, ?, ?)",
+                (job_id, video_path, json.dumps(options or {}), now, now),
+            )
+        return job_id
+
+    def create_batch(self, files, options=None, keep_files=False):
+        """Queue a job for every (name, path) of `files` under one batch ID and return it.
+
+        With keep_files the files belong to the caller and are left in place once processed.
+        """
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT INTO jobs (id, status, stage, video_path, options, batch_id, name, keep_file, created_at, updated_at) "
+                "VALUES (?, 'queued', 'queued', ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (uuid.uuid4().hex, path, json.dumps(options or {}), batch_id, name, int(keep_files), now, now)
+                    for name, path in files
+                ],
+            )
+        return batch_id
+
+    def get_batch(self, batch_id):
+        """Return the number of jobs of a batch in each status, or None for an unknown batch."""
+        with self._connect(immediate=False) as connection:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) AS jobs FROM jobs WHERE batch_id = ? GROUP BY status", (batch_id,)
+            ).fetchall()
+        return {row["status"]: row["jobs"] for row in rows} or None
+
+    def get_batch_results(self, batch_id, after=0):
+        """Return the finished jobs of a batch in the order they finished, starting at the `after`th."""
+        with self._connect(immediate=False) as connection:
+            rows = connection.execute(
+                "SELECT * FROM jobs WHERE batch_id = ? AND finished_seq >= ? ORDER BY finished_seq", (batch_id, after)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, job_id):
+        with self._connect(immediate=False) as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def claim(self, worker_id):
+        """Move the oldest queued job to running for this worker and return it."""
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'queued', stage = 'queued', worker_id = NULL, updated_at = ? "
+                "WHERE status = 'running' AND heartbeat_at < ?",
+                (now, now - STALE_JOB_SECONDS),
+            )
+            abandoned = connection.execute(
+                "SELECT id, video_path, keep_file FROM jobs WHERE status = 'queued' AND attempts >= ?", (MAX_ATTEMPTS,)
+            ).fetchall()
+            for job in abandoned:
+                connection.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Job failed after repeated attempts.', updated_at = ?, "
+                    f"finished_seq = {FINISHED_SEQ} WHERE id = ?",
+                    (now, job["id"]),
+                )
+                if not job["keep_file"]:
+                    remove_files(job["video_path"])
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker_id = ?, "
+                "updated_at = ?, heartbeat_at = ? WHERE id = ?",
+                (worker_id, now, now, row["id"]),
+            )
+            # A retried job labels its dialog again from the start
+            self._remove_entries(connection, row["id"], "job_id = ?", (row["id"],))
+        return dict(row)
+
+    def update(self, job_id, stage, progress):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET stage = ?, progress = ?, updated_at = ?, heartbeat_at = ? WHERE id = ?",
+                (stage, progress, now, now, job_id),
+            )
+
+    def add_entry(self, job_id, entry, window=None, attempt=0):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO dialog_entries (job_id, seq, entry, window_key, attempt) "
+                "SELECT ?, COALESCE(MAX(seq) + 1, 0), ?, ?, ? FROM dialog_entries WHERE job_id = ?",
+                (job_id, json.dumps(entry), window, attempt, job_id),
+            )
+
+    def retract_entries(self, job_id, window):
+        """Remove the entries a labeling window stored before it is labeled again."""
+        with self._connect() as connection:
+            self._remove_entries(connection, job_id, "job_id = ? AND window_key = ?", (job_id, window))
+
+    def _remove_entries(self, connection, job_id, where, params):
+        first = connection.execute(f"SELECT MIN(seq) AS seq FROM dialog_entries WHERE {where}", params).fetchone()
+        if first["seq"] is None:
+            return
+        connection.execute(f"DELETE FROM dialog_entries WHERE {where}", params)
+        connection.execute(
+            "INSERT INTO dialog_resets (job_id, revision, seq) "
+            "SELECT ?, COALESCE(MAX(revision) + 1, 1), ? FROM dialog_resets WHERE job_id = ?",
+            (job_id, first["seq"], job_id),
+        )
+
+    def get_entries(self, job_id, after=0, revision=0):
+        """Return (entries, start, revision) for a reader that has read `after` entries as of `revision`.
+
+        When entries the reader may already have were taken back since its revision, the
+        entries start before `after`, and the reader replaces what it has from `start` on.
+        """
+        with self._connect(immediate=False) as connection:
+            reset = connection.execute(
+                "SELECT MIN(seq) AS seq, MAX(revision) AS revision FROM dialog_resets WHERE job_id = ? AND revision > ?",
+                (job_id, revision),
+            ).fetchone()
+            start = min(after, reset["seq"]) if reset["seq"] is not None else after
+            rows = connection.execute(
+                "SELECT entry FROM dialog_entries WHERE job_id = ? AND seq >= ? ORDER BY seq", (job_id, start)
+            ).fetchall()
+        return [json.loads(row["entry"]) for row in rows], start, reset["revision"] or revision
+
+    def heartbeat(self, worker_id):
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE worker_id = ? AND status = 'running'",
+                (time.time(), worker_id),
+            )
+
+    def complete(self, job_id, result):
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'completed', stage = 'completed', progress = 100, result = ?, "
+                f"updated_at = ?, finished_seq = {FINISHED_SEQ} WHERE id = ?",
+                (json.dumps(result), time.time(), job_id),
+            )
+
+    def fail(self, job_id, error):
+        with self._connect() as connection:
+            connection.execute(
+                f"UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, finished_seq = {FINISHED_SEQ} WHERE id = ?",
+                (error, time.time(), job_id),
+            )
+
+
+class _Transaction:
+    # Runs the statements of a `with` block in one transaction and closes the connection
+    def __init__(self, connection, immediate):
+        self.connection = connection
+        self.immediate = immediate
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE" if self.immediate else "BEGIN")
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.connection.close()
+
+
+class JobRunner:
+    """Background threads that take jobs from the store and run them one at a time each."""
+
+    def __init__(self, store, process, workers=1, poll_seconds=2):
+        self.store = store
+        self.process = process
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Semaphore(0)
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._started or self.workers < 1:
+                return
+            self._started = True
+        for index in range(self.workers):
+            threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True).start()
+        threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+        logging.info(f"Started {self.workers} job workers ({self.worker_id}).")
+
+    def notify(self):
+        self._wake.release()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                self.store.heartbeat(self.worker_id)
+            except sqlite3.Error as e:
+                logging.warning(f"Could not record job heartbeat: {str(e)}")
+
+    def _work(self):
+        while True:
+            try:
+                job = self.store.claim(self.worker_id)
+            except sqlite3.Error as e:
+                logging.error(f"Error while claiming a job: {str(e)}")
+                job = None
+            if job is None:
+                self._wake.acquire(timeout=self.poll_seconds)
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        job_id = job["id"]
+        logging.info(f"Running job {job_id} (attempt {job['attempts'] + 1}).")
+
+        def report_stage(stage, progress):
+            self.store.update(job_id, stage, progress)
+
+        def report_entry(entry, window=None, attempt=0):
+            if entry is None:
+                self.store.retract_entries(job_id, window)
+            else:
+                self.store.add_entry(job_id, entry, window, attempt)
+
+        try:
+            result = self.process(
+                job["video_path"], report_stage=report_stage, report_entry=report_entry,
+                options=json.loads(job["options"] or "{}"),
+            )
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {str(e)}")
+            self.store.fail(job_id, str(e))
+        else:
+            self.store.complete(job_id, result)
+            logging.info(f"Job {job_id} completed.")
+        finally:
+            if not job["keep_file"]:
+                remove_files(job["video_path"])
@@ -0,0 +1,79 @@
+import logging
+import threading
+
+from .model_registry import estimate_model_size
+
+# Seconds of transcription per second of audio, used until the worker has measured its own
+DEFAULT_REAL_TIME_FACTORS = {
+    "cpu": {"tiny": 0.05, "base": 0.1, "small": 0.3, "medium": 0.8, "large": 1.6, "turbo": 0.5},
+    "cuda": {"tiny": 0.01, "base": 0.015, "small": 0.03, "medium": 0.06, "large": 0.1, "turbo": 0.03},
+}
+
+# Disk read and deserialization speed assumed for a model that has never been loaded here
+LOAD_BYTES_PER_SECOND = 300 * 1024 ** 2
+
+# Weight of the latest measurement in the running real-time factor estimate
+SMOOTHING = 0.3
+
+
+class ModelPolicy:
+    """Picks the largest Whisper model expected to finish within a latency budget.
+
+    Real-time factors start from rough defaults and follow the ones measured on this
+    worker, so the choice adapts to the host it runs on.
+    """
+
+    def __init__(self, registry, candidates):
+        self.registry = registry
+        self.candidates = candidates
+        self._real_time_factors = {}
+        self._lock = threading.Lock()
+
+    def real_time_factor(self, name, device):
+        with self._lock:
+            measured = self._real_time_factors.get((name, device))
+        if measured is not None:
+            return measured
+        defaults = DEFAULT_REAL_TIME_FACTORS.get(device, DEFAULT_REAL_TIME_FACTORS["cpu"])
+        return defaults.get(name.split(".")[0].split("-")[0], defaults["large"])
+
+    def expected_seconds(self, name, audio_seconds, device, quantize=False):
+        """Expected time to load (when not resident) and transcribe audio_seconds of audio."""
+        seconds = audio_seconds * self.real_time_factor(name, device)
+        if not self.registry.is_resident(name, device, quantize):
+            load_seconds = self.registry.load_times.get((name, device, quantize))
+            if load_seconds is None:
+                load_seconds = estimate_model_size(name, quantize) / LOAD_BYTES_PER_SECOND
+            seconds += load_seconds
+        return seconds
+
+    def select(self, audio_seconds, budget_seconds, device, quantize=False):
+        """Return (model name, expected seconds) for the largest candidate that fits the budget.
+
+        Candidates are ordered from smallest to largest; the smallest one is used when none fits.
+        """
+        choice = self.candidates[0]
+        for name in self.candidates:
+            if self.expected_seconds(name, audio_seconds, device, quantize) <= budget_seconds:
+                choice = name
+        expected = self.expected_seconds(choice, audio_seconds, device, quantize)
+        logging.info(
+            f"Selected Whisper model '{choice}' for {audio_seconds:.0f}s of audio "
+            f"(expected {expected:.1f}s, budget {budget_seconds:.0f}s)."
+        )
+        return choice, expected
+
+    def record(self, name, device, audio_seconds, transcribe_seconds):
+        """Fold a measured transcription time into the model's real-time factor."""
+        if audio_seconds <= 0:
+            return
+        measured = transcribe_seconds / audio_seconds
+        with self._lock:
+            previous = self._real_time_factors.get((name, device))
+            self._real_time_factors[(name, device)] = (
+                measured if previous is None else previous + SMOOTHING * (measured - previous)
+            )
+
+    def stats(self):
+        with self._lock:
+            return {f"{name}@{device}": round(factor, 4) for (name, device), factor in self._real_time_factors.items()}
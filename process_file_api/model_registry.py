@@ -0,0 +1,203 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+
+from .backends import get_backend
+
+# Approximate parameter counts, used to make room before a model is loaded
+ESTIMATED_PARAMETERS = {
+    "tiny": 39_000_000,
+    "base": 74_000_000,
+    "small": 244_000_000,
+    "medium": 769_000_000,
+    "large": 1_550_000_000,
+    "turbo": 809_000_000,
+}
+
+
+def select_device():
+    """Pick CUDA when it is available, otherwise fall back to the CPU."""
+    if torch.cuda.is_available():
+        logging.info(f"Using CUDA: {torch.cuda.get_device_name(0)}")
+        return "cuda"
+    logging.warning("CUDA is not available. Using CPU instead.")
+    return "cpu"
+
+
+def model_size_in_bytes(model):
+    """Return the memory held by the parameters and buffers of a model."""
+    if hasattr(model, "size_in_bytes"):
+        return model.size_in_bytes()
+    tensors = list(model.parameters()) + list(model.buffers())
+    # Dynamically quantized layers keep their int8 weights in packed params instead
+    for module in model.modules():
+        if isinstance(module, torch.ao.nn.quantized.dynamic.Linear):
+            tensors += [tensor for tensor in (module.weight(), module.bias()) if tensor is not None]
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+def estimate_model_size(name, quantize=False):
+    """Estimate the size of a Whisper model before it is loaded."""
+    base_name = name.split(".")[0].split("-")[0]
+    # Nearly all of Whisper's weights sit in linear layers, which int8 stores in a quarter of the space
+    return ESTIMATED_PARAMETERS.get(base_name, ESTIMATED_PARAMETERS["large"]) * (1 if quantize else 4)
+
+
+def process_rss_bytes():
+    """Return the resident memory of the current process, or 0 where /proc is not available."""
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def quantize_model(model):
+    """Apply dynamic int8 quantization to the linear layers of a CPU Whisper model."""
+    for module in model.modules():
+        # Whisper's Linear subclass only casts weights to the input dtype, which is a no-op in fp32
+        if isinstance(module, torch.nn.Linear):
+            module.__class__ = torch.nn.Linear
+    # In place, so memory-mapped fp32 weights are released instead of copied
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class ModelRegistry:
+    """Keeps Whisper models resident across requests and evicts the least recently used ones."""
+
+    def __init__(self, memory_budget_bytes=0, device=None, backend="whisper"):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.backend = get_backend(backend)
+        self._device = device
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per model being loaded, so a cold load only blocks requests for that same model
+        self._loading = {}
+        self._loading_bytes = 0
+        self.load_times = {}
+        self.hits = 0
+        self.misses = 0
+        # Called with the (name, device, quantize) key of every model that leaves the registry
+        self.eviction_listeners = []
+
+    @property
+    def device(self):
+        if self._device is None:
+            self._device = select_device()
+        return self._device
+
+    def resident_bytes(self):
+        return sum(size for _, size in self._models.values())
+
+    def is_resident(self, name, device=None, quantize=False):
+        return (name, device or self.device, quantize) in self._models
+
+    def get(self, name, device=None, quantize=False):
+        """Return a loaded model, loading it on first use."""
+        device = device or self.device
+        if quantize and device != "cpu":
+            logging.warning(f"int8 quantization is only supported on CPU, loading '{name}' in full precision on {device}.")
+            quantize = False
+        key = (name, device, quantize)
+        with self._lock:
+            model = self._resident(key)
+            if model is not None:
+                return model
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Requests for the same model wait here for the one load; everything else carries on
+        with load_lock:
+            estimate = estimate_model_size(name, quantize)
+            with self._lock:
+                model = self._resident(key)
+                if model is not None:
+                    return model
+                self.misses += 1
+                self._make_room(estimate)
+                self._loading_bytes += estimate
+
+            try:
+                logging.info(f"Loading {self.backend.name} model '{name}' on {device}{' (int8)' if quantize else ''}...")
+                rss_before = process_rss_bytes()
+                start = time.perf_counter()
+                model = self.backend.load_model(name, device, quantize)
+                load_seconds = time.perf_counter() - start
+                size = model_size_in_bytes(model)
+                logging.info(
+                    f"Loaded Whisper model '{name}' in {load_seconds:.2f}s "
+                    f"({size / 1024 ** 2:.0f} MB, process RSS {rss_before / 1024 ** 2:.0f} MB -> "
+                    f"{process_rss_bytes() / 1024 ** 2:.0f} MB)."
+                )
+                # Lets whatever is kept alongside the model, such as its segment workers, be found again by key
+                model.registry_key = key
+                with self._lock:
+                    self.load_times[key] = load_seconds
+                    self._models[key] = (model, size)
+            finally:
+                with self._lock:
+                    self._loading_bytes -= estimate
+                    self._loading.pop(key, None)
+                    self._make_room(0)
+            return model
+
+    def _resident(self, key):
+        # Called with the lock held
+        if key not in self._models:
+            return None
+        self._models.move_to_end(key)
+        self.hits += 1
+        return self._models[key][0]
+
+    def preload(self, names, device=None, quantize=False):
+        for name in names:
+            try:
+                self.get(name, device, quantize)
+            except Exception as e:
+                logging.error(f"Error while preloading Whisper model '{name}': {str(e)}")
+
+    def evict(self, name, device=None, quantize=False):
+        key = (name, device or self.device, quantize)
+        with self._lock:
+            evicted = self._models.pop(key, None) is not None
+        if evicted:
+            self._notify_evicted(key)
+
+    def _notify_evicted(self, key):
+        for listener in self.eviction_listeners:
+            try:
+                listener(key)
+            except Exception as e:
+                logging.error(f"Error while releasing evicted model {model_label(*key)}: {str(e)}")
+
+    def _make_room(self, incoming_bytes):
+        # Models still used by an in-flight request stay alive until that request drops them
+        if not self.memory_budget_bytes:
+            return
+        # Models that are still loading count against the budget too
+        while self._models and self.resident_bytes() + self._loading_bytes + incoming_bytes > self.memory_budget_bytes:
+            if incoming_bytes == 0 and len(self._models) == 1:
+                break
+            key, _ = self._models.popitem(last=False)
+            logging.info(f"Evicted Whisper model '{key[0]}' on {key[1]} to stay within the memory budget.")
+            # Listeners only release resources and never call back into the registry, so the lock can stay held
+            self._notify_evicted(key)
+        if self._device == "cuda":
+            torch.cuda.empty_cache()
+
+    def stats(self):
+        return {
+            "resident": [model_label(*key) for key in self._models],
+            "resident_mb": round(self.resident_bytes() / 1024 ** 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rss_mb": round(process_rss_bytes() / 1024 ** 2),
+            "load_seconds": {model_label(*key): round(seconds, 3) for key, seconds in self.load_times.items()},
+        }
+
+
+def model_label(name, device, quantize=False):
+    return f"{name}{'-int8' if quantize else ''}@{device}"
@@ -0,0 +1,149 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+
+from . import config
+from .config import SAMPLE_RATE
+
+# Length of the frames used to measure loudness when looking for a split point
+FRAME_SECONDS = 0.03
+
+# How far around the target boundary we look for the quietest frame
+SEARCH_SECONDS = 10
+
+# Length of the previous window's text passed as the prompt of the next sequential window
+PROMPT_CHARACTERS = 200
+
+# Segment worker pools by the registry key of the model they were forked from, with what each was started with
+_pools = {}
+_pool_lock = threading.Lock()
+
+# Model used by a segment worker process, set once by the pool initializer
+_worker_model = None
+
+
+def find_split_points(audio, segment_seconds=None, search_seconds=SEARCH_SECONDS):
+    """Return (start, end) sample ranges of roughly segment_seconds, cut at the quietest nearby frame."""
+    segment_samples = int((segment_seconds or config.TRANSCRIBE_SEGMENT_SECONDS) * SAMPLE_RATE)
+    frame = int(FRAME_SECONDS * SAMPLE_RATE)
+    frame_count = len(audio) // frame
+    if frame_count == 0 or len(audio) <= segment_samples:
+        return [(0, len(audio))]
+
+    energy = np.sqrt(np.mean(np.square(audio[:frame_count * frame].reshape(frame_count, frame)), axis=1))
+    search_frames = int(search_seconds / FRAME_SECONDS)
+
+    boundaries = [0]
+    while len(audio) - boundaries[-1] > segment_samples + search_frames * frame:
+        target = (boundaries[-1] + segment_samples) // frame
+        low = max(boundaries[-1] // frame + 1, target - search_frames)
+        high = min(frame_count, target + search_frames + 1)
+        quietest = low + int(np.argmin(energy[low:high]))
+        boundaries.append(quietest * frame + frame // 2)
+    boundaries.append(len(audio))
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _init_worker(model, threads):
+    global _worker_model
+    torch.set_num_threads(threads)
+    _worker_model = model
+
+
+def transcribe_range(model, start_sample, samples, **options):
+    """Transcribe one window of samples and shift its timestamps to the recording's timeline."""
+    offset = start_sample / SAMPLE_RATE
+    result = model.transcribe(samples, **{**config.WHISPER_TRANSCRIBE_OPTIONS, **options})
+    segments = [
+        {**segment, "start": segment["start"] + offset, "end": segment["end"] + offset}
+        for segment in result.get("segments", [])
+    ]
+    return result.get("text", "").strip(), segments
+
+
+def _transcribe_segment(start_sample, samples):
+    return transcribe_range(_worker_model, start_sample, samples)
+
+
+def threads_per_worker(workers, cores=None):
+    """Split the granted cores (all of the host's by default) evenly between the segment workers."""
+    return config.TRANSCRIBE_THREADS_PER_WORKER or max(1, (len(cores) if cores else os.cpu_count() or 1) // workers)
+
+
+def _get_pool(model, workers, threads):
+    # Called with the pool lock held; a pool is kept for each resident model until the registry evicts it
+    key = getattr(model, "registry_key", None) or id(model)
+    settings = (id(model), workers, threads)
+    pool, started_with = _pools.get(key, (None, None))
+    if pool is None or started_with != settings:
+        if pool is not None:
+            pool.shutdown(wait=False)
+        # Forked workers share the parent's weight pages instead of loading their own copy
+        context = multiprocessing.get_context("fork")
+        logging.info(f"Starting {workers} transcription workers with {threads} threads each.")
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(model, threads)
+        )
+        _pools[key] = (pool, settings)
+    return pool
+
+
+def submit_segments(model, audio, ranges, workers, threads):
+    """Queue (start, end) sample ranges on the model's worker pool and return their futures in order."""
+    # Submitting under the lock means an eviction cannot shut the pool down before the segments are queued,
+    # and work that is already queued still finishes after a shutdown
+    with _pool_lock:
+        pool = _get_pool(model, workers, threads)
+        return [pool.submit(_transcribe_segment, start, audio[start:end]) for start, end in ranges]
+
+
+def shutdown_pool(key):
+    """Stop the worker pool forked from the model with this registry key, once the registry has evicted it."""
+    with _pool_lock:
+        pool, _ = _pools.pop(key, (None, None))
+    if pool is not None:
+        logging.info(f"Stopping the transcription workers of evicted model {key}.")
+        pool.shutdown(wait=False)
+
+
+def can_transcribe_in_parallel(model, workers=None):
+    """Segment workers are forked from the resident model, which only works for CPU PyTorch models."""
+    workers = workers or config.TRANSCRIBE_WORKERS
+    return workers > 1 and model.device.type == "cpu" and getattr(model, "fork_safe", True)
+
+
+def iter_transcribed_windows(model, audio, segment_seconds=None, workers=None, threads=None, cores=None):
+    """Yield (text, segments) for each silence-aligned window of a recording, in order.
+
+    `cores` are the CPU cores granted to this transcription, divided between the segment workers.
+    """
+    ranges = find_split_points(audio, segment_seconds)
+    workers = workers or config.TRANSCRIBE_WORKERS
+    if can_transcribe_in_parallel(model, workers):
+        logging.info(f"Transcribing {len(ranges)} segments in parallel...")
+        futures = submit_segments(model, audio, ranges, workers, threads or threads_per_worker(workers, cores))
+        for future in futures:
+            yield future.result()
+        return
+
+    previous_text = ""
+    for start, end in ranges:
+        # Carry the tail of the previous window over, like condition_on_previous_text does within a window
+        text, segments = transcribe_range(model, start, audio[start:end], initial_prompt=previous_text[-PROMPT_CHARACTERS:] or None)
+        previous_text = text or previous_text
+        yield text, segments
+
+
+def transcribe_in_segments(model, audio, workers=None, threads=None, cores=None):
+    """Transcribe a CPU recording in silence-aligned segments on a process pool."""
+    windows = list(iter_transcribed_windows(model, audio, workers=workers, threads=threads, cores=cores))
+    text = " ".join(text for text, _ in windows if text)
+    segments = [segment for _, window_segments in windows for segment in window_segments]
+    for segment_id, segment in enumerate(segments):
+        segment["id"] = segment_id
+    return {"text": text, "segments": segments}
@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import torch
+
+
+def available_cores():
+    """Return the CPU cores this process may run on."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+class CpuScheduler:
+    """Partitions the CPU cores between concurrent transcriptions so they do not oversubscribe the host.
+
+    A job waits in a FIFO queue until enough cores are free. When it starts, it gets an
+    even share of the free cores between itself and the jobs queued behind it that can
+    start too, but never fewer than min_threads. Its torch thread count is set to that
+    share, and with affinity enabled the calling thread is pinned to those cores.
+
+    A job is never given more than max_threads cores. When max_jobs is set and
+    max_threads is not, that cap is len(cores) // max_jobs, so a job that starts alone
+    leaves room for the ones arriving after it. With neither set, a job that starts
+    alone takes every core and later jobs wait for it, so transcriptions effectively
+    run one at a time unless they arrive together.
+    """
+
+    def __init__(self, cores=None, max_jobs=0, min_threads=2, max_threads=0, affinity=False):
+        self.cores = cores or available_cores()
+        self.min_threads = max(1, min(min_threads, len(self.cores)))
+        if not max_threads and max_jobs:
+            max_threads = max(self.min_threads, len(self.cores) // max_jobs)
+        self.max_threads = max_threads or len(self.cores)
+        self.max_jobs = max_jobs or max(1, len(self.cores) // self.min_threads)
+        self.affinity = affinity and hasattr(os, "sched_setaffinity")
+        self._free = list(self.cores)
+        self._queue = deque()
+        self._running = 0
+        self._condition = threading.Condition()
+        self.completed = 0
+        self.wait_seconds = 0.0
+
+    def _grant(self, ticket):
+        # Only the head of the queue may start, and only when it can get its minimum share of cores
+        if not self._queue or self._queue[0] is not ticket or self._running >= self.max_jobs:
+            return None
+        if self._running and len(self._free) < self.min_threads:
+            return None
+        starting = max(1, min(len(self._queue), self.max_jobs - self._running))
+        threads = min(self.max_threads, len(self._free), max(self.min_threads, len(self._free) // starting))
+        cores, self._free = self._free[:threads], self._free[threads:]
+        return cores
+
+    @contextmanager
+    def slot(self, exclusive=False):
+        """Wait for a share of the CPU and run the block with torch limited to it.
+
+        An exclusive slot waits until the whole machine is idle, for work that partitions
+        the cores itself, such as the segment worker pool.
+        """
+        ticket = object()
+        start = time.perf_counter()
+        with self._condition:
+            self._queue.append(ticket)
+            while True:
+                if exclusive:
+                    cores = self._free if self._queue[0] is ticket and not self._running else None
+                    if cores:
+                        self._free = []
+                else:
+                    cores = self._grant(ticket)
+                if cores:
+                    break
+                self._condition.wait()
+            self._queue.popleft()
+            self._running += 1
+            waited = time.perf_counter() - start
+            self.wait_seconds += waited
+            # The next job in line may be able to start on the cores that are still free
+            self._condition.notify_all()
+        if waited > 0.1:
+            logging.info(f"Waited {waited:.2f}s for {len(cores)} CPU cores.")
+
+        previous_threads = torch.get_num_threads()
+        previous_affinity = os.sched_getaffinity(0) if self.affinity else None
+        try:
+            torch.set_num_threads(len(cores))
+            if self.affinity:
+                os.sched_setaffinity(0, cores)
+            yield cores
+        finally:
+            torch.set_num_threads(previous_threads)
+            if self.affinity:
+                os.sched_setaffinity(0, previous_affinity)
+            with self._condition:
+                self._free = sorted(self._free + cores)
+                self._running -= 1
+                self.completed += 1
+                self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                "cores": len(self.cores),
+                "free_cores": len(self._free),
+                "running": self._running,
+                "queued": len(self._queue),
+                "max_jobs": self.max_jobs,
+                "completed": self.completed,
+                "wait_seconds": round(self.wait_seconds, 3),
+            }
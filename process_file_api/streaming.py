@@ -0,0 +1,76 @@
+import json
+import threading
+
+_decoder = json.JSONDecoder()
+
+
+def iter_json_array_items(chunks):
+    """Yield the items of a JSON array as soon as each one is complete in a stream of text chunks.
+
+    Raises json.JSONDecodeError when the stream is not a JSON array or ends before it is closed.
+    """
+    buffer = ""
+    position = 0
+    started = False
+    for chunk in chunks:
+        buffer += chunk
+        while True:
+            # Skip whitespace and the separators between items
+            while position < len(buffer) and (buffer[position].isspace() or (started and buffer[position] == ",")):
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != "[":
+                    raise json.JSONDecodeError("Expected a JSON array", buffer, position)
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                item, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The item is not complete yet, wait for the next chunk
+                break
+            yield item
+            position = end
+        # Drop what has been parsed so the buffer only holds the item in progress
+        buffer = buffer[position:]
+        position = 0
+    raise json.JSONDecodeError("Unterminated JSON array", buffer, position)
+
+
+class OrderedEntries:
+    """Forwards entries produced by concurrently labeled windows in window order.
+
+    Entries of the earliest unfinished window go straight to the callback, later windows
+    are held back until every window before them has finished. Every entry is tagged with
+    the key of the labeling window it came from and its attempt. An entry of None retracts
+    what that window passed on so far, because it is about to be labeled again: entries
+    still held back are dropped here, otherwise the retraction is forwarded.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self._current = 0
+        self._pending = {}
+        self._finished = set()
+        self._lock = threading.Lock()
+
+    def add(self, index, entry, window=None, attempt=0):
+        with self._lock:
+            if index == self._current:
+                self.callback(entry, window=window, attempt=attempt)
+            elif entry is None:
+                self._pending[index] = [item for item in self._pending.get(index, []) if item[1] != window]
+            else:
+                self._pending.setdefault(index, []).append((entry, window, attempt))
+
+    def finish(self, index):
+        with self._lock:
+            self._finished.add(index)
+            while self._current in self._finished:
+                self._current += 1
+                for entry, window, attempt in self._pending.pop(self._current, []):
+                    self.callback(entry, window=window, attempt=attempt)
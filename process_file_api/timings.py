@@ -0,0 +1,114 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets in seconds; slower samples land in the overflow bucket
+BUCKET_BOUNDS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Percentiles are computed over the most recent samples of each stage
+RECENT_SAMPLES = 1000
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class StageTimer:
+    """Records how long each processing stage of one request took."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    @contextmanager
+    def wait_for(self, slot, name="queue"):
+        """Enter a semaphore or CPU slot, counting the time it took to get in as the `name` stage."""
+        start = time.perf_counter()
+        with slot as value:
+            self.add(name, time.perf_counter() - start)
+            yield value
+
+    def add(self, name, seconds):
+        # A stage that runs more than once, such as a retried call, accumulates its time
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def as_dict(self):
+        """Return stage durations in seconds, with the overall request time as "total"."""
+        timings = {name: round(seconds, 3) for name, seconds in self.durations.items()}
+        timings["total"] = round(self.total(), 3)
+        return timings
+
+
+def server_timing_header(timings):
+    """Format a {stage: seconds} dict as a Server-Timing header value in milliseconds."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+class StageMetrics:
+    """Aggregates stage timings across requests into histograms and percentiles."""
+
+    def __init__(self, bucket_bounds=BUCKET_BOUNDS, recent_samples=RECENT_SAMPLES):
+        self.bucket_bounds = bucket_bounds
+        self.recent_samples = recent_samples
+        self._stages = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def record(self, timings, failed=False):
+        with self._lock:
+            self.requests += 1
+            if failed:
+                self.errors += 1
+            for name, seconds in timings.items():
+                stage = self._stages.get(name)
+                if stage is None:
+                    stage = self._stages[name] = {
+                        "count": 0,
+                        "sum": 0.0,
+                        "buckets": [0] * (len(self.bucket_bounds) + 1),
+                        "recent": deque(maxlen=self.recent_samples),
+                    }
+                stage["count"] += 1
+                stage["sum"] += seconds
+                stage["buckets"][bisect.bisect_left(self.bucket_bounds, seconds)] += 1
+                stage["recent"].append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            stages = {}
+            for name, stage in self._stages.items():
+                recent = sorted(stage["recent"])
+                summary = {
+                    "count": stage["count"],
+                    "mean": round(stage["sum"] / stage["count"], 3),
+                    "max": round(recent[-1], 3),
+                }
+                for percentile in PERCENTILES:
+                    summary[f"p{percentile}"] = round(_percentile(recent, percentile), 3)
+                labels = [f"le_{bound}" for bound in self.bucket_bounds] + ["le_inf"]
+                # Cumulative counts, as in a Prometheus histogram
+                cumulative = 0
+                summary["histogram"] = {}
+                for label, count in zip(labels, stage["buckets"]):
+                    cumulative += count
+                    summary["histogram"][label] = cumulative
+                stages[name] = summary
+            return {"requests": self.requests, "errors": self.errors, "stages": stages}
+
+
+def _percentile(values, percentile):
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, -(-len(values) * percentile // 100) - 1)
+    return values[min(index, len(values) - 1)]
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+# Block size used when hashing audio files from disk
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_audio(audio):
+    """Return the SHA-256 of decoded samples or of an audio file."""
+    digest = hashlib.sha256()
+    if isinstance(audio, np.ndarray):
+        digest.update(np.ascontiguousarray(audio).data)
+    else:
+        with open(audio, "rb") as audio_file:
+            while chunk := audio_file.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(*parts):
+    """Combine the audio hash with model and prompt versions into one cache key."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+    """Disk-backed JSON cache that evicts the least recently used entries above a size limit."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as entry:
+                value = json.load(entry)
+            # The modification time doubles as the last access time for LRU eviction
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as entry:
+                json.dump(value, entry)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write transcript cache entry {key}: {str(e)}")
+            return
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
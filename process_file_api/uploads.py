@@ -0,0 +1,33 @@
+import logging
+import os
+import shutil
+import tempfile
+
+# Size of each block copied from the request stream to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def save_upload(file, directory=None, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Copy an uploaded file to a unique temporary path without holding it in memory."""
+    suffix = os.path.splitext(os.path.basename(file.filename or ""))[1]
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            shutil.copyfileobj(getattr(file, "stream", file), temp_file, chunk_size)
+    except Exception:
+        remove_files(path)
+        raise
+    return path
+
+
+def remove_files(*paths):
+    """Delete temporary files, ignoring the ones that were never created."""
+    for path in paths:
+        if not path:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"Could not remove temporary file {path}: {str(e)}")
@@ -0,0 +1,114 @@
+import numpy as np
+
+from . import config
+from .config import SAMPLE_RATE
+
+# Length of the frames whose loudness decides between speech and silence
+FRAME_SECONDS = 0.03
+
+# Silence inserted between kept regions so Whisper still hears a pause at every cut
+GAP_SECONDS = 0.2
+
+
+def frame_levels(audio, frame_seconds=FRAME_SECONDS):
+    """Return the RMS level of every frame in dBFS."""
+    frame = int(frame_seconds * SAMPLE_RATE)
+    frame_count = len(audio) // frame
+    frames = audio[:frame_count * frame].reshape(frame_count, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def detect_speech(audio, margin_db=None, min_silence_seconds=None, padding_seconds=None, min_speech_seconds=0.25):
+    """Return (start, end) sample ranges that are loud enough to contain speech.
+
+    The threshold adapts to the recording: frames are speech when they are margin_db
+    above the noise floor (the 10th percentile level). Pauses shorter than
+    min_silence_seconds are kept so sentences are not cut apart. A recording whose
+    loudest frames (the 99th percentile level) are less than margin_db above the floor
+    has no silence to find (continuous talking, speech over steady noise, a tone), so
+    it is kept whole. Mostly silent recordings still pass, since their loudest frames
+    are the speech.
+    """
+    margin_db = config.VAD_MARGIN_DB if margin_db is None else margin_db
+    min_silence_seconds = config.VAD_MIN_SILENCE_SECONDS if min_silence_seconds is None else min_silence_seconds
+    padding_seconds = config.VAD_PADDING_SECONDS if padding_seconds is None else padding_seconds
+
+    levels = frame_levels(audio)
+    if len(levels) == 0:
+        return [(0, len(audio))] if len(audio) else []
+    noise_floor = np.percentile(levels, 10)
+    if np.percentile(levels, 99) - noise_floor < margin_db:
+        return [(0, len(audio))]
+    speech = levels > max(noise_floor + margin_db, config.VAD_MIN_LEVEL_DB)
+
+    frame = int(FRAME_SECONDS * SAMPLE_RATE)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.astype(np.int8), [0]))))
+    runs = [(int(start) * frame, int(end) * frame) for start, end in zip(edges[::2], edges[1::2])]
+
+    regions = []
+    padding = int(padding_seconds * SAMPLE_RATE)
+    for start, end in runs:
+        if end - start < min_speech_seconds * SAMPLE_RATE:
+            continue
+        start, end = max(0, start - padding), min(len(audio), end + padding)
+        if regions and start - regions[-1][1] < min_silence_seconds * SAMPLE_RATE:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def remove_silence(audio):
+    """Keep only the speech regions of a recording.
+
+    Returns the shortened audio, an offset map of (kept_start, original_start, length)
+    entries in seconds for restore_timestamps, and stats about the skipped audio.
+    """
+    # Whisper must never get an empty array, so keep the original when nothing clears the threshold
+    regions = detect_speech(audio) or [(0, len(audio))]
+    gap = np.zeros(int(GAP_SECONDS * SAMPLE_RATE), dtype=audio.dtype)
+
+    pieces = []
+    offset_map = []
+    kept_samples = 0
+    for start, end in regions:
+        if pieces:
+            pieces.append(gap)
+            kept_samples += len(gap)
+        pieces.append(audio[start:end])
+        offset_map.append((kept_samples / SAMPLE_RATE, start / SAMPLE_RATE, (end - start) / SAMPLE_RATE))
+        kept_samples += end - start
+
+    speech_seconds = sum(length for _, _, length in offset_map)
+    original_seconds = len(audio) / SAMPLE_RATE
+    stats = {
+        "OriginalSeconds": round(original_seconds, 2),
+        "SpeechSeconds": round(speech_seconds, 2),
+        "SkippedSeconds": round(original_seconds - speech_seconds, 2),
+        "SkippedRatio": round(1 - speech_seconds / original_seconds, 3) if original_seconds else 0.0,
+        "Regions": len(regions),
+    }
+    kept = np.concatenate(pieces) if pieces else audio[:0]
+    return kept, offset_map, stats
+
+
+def restore_time(seconds, offset_map):
+    """Map a time in the shortened audio back to the original recording."""
+    if not offset_map:
+        return seconds
+    for kept_start, original_start, length in reversed(offset_map):
+        if seconds >= kept_start:
+            # Times inside the inserted gap are clamped to the end of the previous region
+            return original_start + min(seconds - kept_start, length)
+    return offset_map[0][1]
+
+
+def restore_timestamps(segments, offset_map):
+    """Return segments with start and end shifted back onto the original timeline."""
+    if not offset_map:
+        return segments
+    return [
+        {**segment, "start": round(restore_time(segment["start"], offset_map), 2), "end": round(restore_time(segment["end"], offset_map), 2)}
+        for segment in segments
+    ]
@@ -0,0 +1,86 @@
+import dataclasses
+import logging
+import os
+import tempfile
+
+import numpy as np
+import torch
+import whisper
+from whisper.model import AudioEncoder, ModelDimensions, TextDecoder, Whisper
+
+from .uploads import remove_files
+
+
+def cached_weights_path(name, cache_dir):
+    return os.path.join(cache_dir, f"{name}-fp32.pt")
+
+
+def save_weights(model, path):
+    """Write a model's fp32 weights in whisper's checkpoint layout, replacing any previous file atomically."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as weights_file:
+            torch.save({"dims": dataclasses.asdict(model.dims), "model_state_dict": model.state_dict()}, weights_file)
+        os.replace(temp_path, path)
+    except Exception:
+        remove_files(temp_path)
+        raise
+
+
+def load_mapped_weights(path, name):
+    """Build a Whisper model whose weights are memory-mapped from a cached checkpoint.
+
+    Nothing is copied: the parameters point straight into the page cache, so worker
+    processes on the same host share one copy of the weights.
+    """
+    checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    dims = ModelDimensions(**checkpoint["dims"])
+    # Mirrors Whisper.__init__, with the encoder and decoder built on the meta device to skip
+    # allocating and initializing weights that are replaced right away
+    model = Whisper.__new__(Whisper)
+    torch.nn.Module.__init__(model)
+    model.dims = dims
+    with torch.device("meta"):
+        model.encoder = AudioEncoder(dims.n_mels, dims.n_audio_ctx, dims.n_audio_state, dims.n_audio_head, dims.n_audio_layer)
+        model.decoder = TextDecoder(dims.n_vocab, dims.n_text_ctx, dims.n_text_state, dims.n_text_head, dims.n_text_layer)
+    model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+
+    # The causal mask and alignment heads are not part of the checkpoint and are rebuilt here
+    n_ctx = dims.n_text_ctx
+    model.decoder.register_buffer("mask", torch.empty(n_ctx, n_ctx).fill_(-np.inf).triu_(1), persistent=False)
+    model.set_alignment_heads(whisper._ALIGNMENT_HEADS[name])
+    if any(tensor.is_meta for tensor in list(model.parameters()) + list(model.buffers())):
+        raise RuntimeError(f"Cached weights in {path} do not cover every tensor of the model.")
+    return model
+
+
+def load_whisper_model(name, device, cache_dir):
+    """Load a Whisper model, memory-mapping its weights from cache_dir when a cached copy exists.
+
+    The first load converts the downloaded checkpoint to an fp32 copy in cache_dir, which
+    later loads on this host map instead of deserializing. Custom checkpoint paths and an
+    empty cache_dir fall back to whisper.load_model.
+    """
+    if not cache_dir or name not in whisper._MODELS:
+        return whisper.load_model(name, device=device)
+
+    path = cached_weights_path(name, cache_dir)
+    if not os.path.exists(path):
+        model = whisper.load_model(name, device="cpu")
+        try:
+            save_weights(model, path)
+        except OSError as e:
+            logging.warning(f"Could not write the weight cache for '{name}': {str(e)}")
+            return model.to(device)
+        logging.info(f"Cached the weights of Whisper model '{name}' in {path}.")
+        # Reload from the cache so this process shares the mapped pages too
+        del model
+
+    try:
+        model = load_mapped_weights(path, name)
+    except Exception as e:
+        logging.warning(f"Discarding unreadable weight cache {path}: {str(e)}")
+        remove_files(path)
+        return whisper.load_model(name, device=device)
+    return model.to(device)
@@ -0,0 +1,56 @@
+import logging
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model("gpt-4o")
+    except Exception as e:
+        logging.warning(f"tiktoken is unavailable, estimating token counts from text length: {str(e)}")
+        return None
+
+
+def count_tokens(text):
+    """Count GPT-4o tokens, or estimate them at four characters per token without tiktoken."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def split_into_windows(segments, max_tokens, overlap_tokens):
+    """Group transcript segments into windows of at most max_tokens.
+
+    Each window is a dict with the segments it owns and, as "context", the trailing
+    segments of the previous window up to overlap_tokens. Context segments are only
+    there to help the model and are labeled by the window that owns them.
+    """
+    sized = [(segment, count_tokens(segment["text"])) for segment in segments]
+
+    groups = []
+    current = []
+    current_tokens = 0
+    for segment, tokens in sized:
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append((segment, tokens))
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+
+    windows = []
+    for index, group in enumerate(groups):
+        context = []
+        context_tokens = 0
+        if index > 0:
+            for segment, tokens in reversed(groups[index - 1]):
+                if context_tokens + tokens > overlap_tokens:
+                    break
+                context.insert(0, segment)
+                context_tokens += tokens
+        windows.append({"context": context, "segments": [segment for segment, _ in group]})
+    return windows
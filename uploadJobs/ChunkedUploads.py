@@ -0,0 +1,258 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+READ_SIZE = 1024 * 1024
+
+
+class ChunkedUploadError(Exception):
+    """Raised with the message and HTTP status code returned to the client when a chunked upload request fails."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def checksum_of_chunks(digests):
+    """SHA-256 over the concatenated SHA-256 digests of the chunks, in order.
+
+    Browsers can hash each chunk as they send it without holding the whole file in
+    memory, so this is the checksum the client declares for the assembled file.
+    """
+    overall = hashlib.sha256()
+    for digest in digests:
+        overall.update(bytes.fromhex(digest))
+    return overall.hexdigest()
+
+
+class ChunkedUploadStore:
+    """Receives files in fixed-size chunks that may arrive in any order, in parallel or more than once.
+
+    Every chunk is written straight to its offset in a preallocated file, so sending a
+    chunk again only rewrites the same bytes and nothing has to be concatenated at the
+    end. The state of each upload is kept as <upload id>.json so an interrupted upload
+    can be resumed after a restart by sending only the missing chunks.
+
+    Uploads untouched for ttl_seconds are removed with their data whenever a new upload
+    starts. Files of uploads larger than max_size (0 for no limit) are refused.
+    """
+
+    def __init__(self, directory, chunk_size, ttl_seconds=24 * 3600, max_size=0):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._uploads = {}
+        self._lock = threading.Lock()
+        # One lock per upload being completed, so verifying a large file never holds up other uploads
+        self._completing = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r') as upload_file:
+                    upload = json.load(upload_file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Skipping unreadable upload file {name}: {str(e)}")
+                continue
+            # A restart interrupted its verification, it is verified again on the next complete request
+            if upload['status'] == 'verifying':
+                upload['status'] = 'receiving'
+            self._uploads[upload['id']] = upload
+        with self._lock:
+            self._expire()
+
+    def _expire(self):
+        # Called with the lock held; uploads nobody came back for are dropped with their data
+        now = time.time()
+        for upload_id, upload in list(self._uploads.items()):
+            if now - upload['updated_at'] > self.ttl_seconds:
+                logging.info(f"Removing chunked upload {upload_id}, untouched for {self.ttl_seconds}s.")
+                del self._uploads[upload_id]
+                self._completing.pop(upload_id, None)
+                self._remove_files(os.path.join(self.directory, f"{upload_id}.json"), upload['path'])
+
+    def _remove_files(self, *paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _save(self, upload):
+        upload['updated_at'] = time.time()
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as upload_file:
+            json.dump(upload, upload_file)
+        os.replace(temp_path, os.path.join(self.directory, f"{upload['id']}.json"))
+
+    def _get(self, upload_id):
+        upload = self._uploads.get(upload_id)
+        if upload is None:
+            raise ChunkedUploadError(f"Upload {upload_id} not found", 404)
+        return upload
+
+    def _chunk_length(self, upload, index):
+        return min(upload['chunk_size'], upload['size'] - index * upload['chunk_size'])
+
+    def create(self, filename, size, fields=None, checksum=None):
+        """Start an upload of `size` bytes and return its state.
+
+        `fields` holds whatever the caller needs again once the upload is complete.
+        """
+        if size <= 0:
+            raise ChunkedUploadError("The file is empty")
+        if self.max_size and size > self.max_size:
+            raise ChunkedUploadError(f"The file is larger than {self.max_size // 1024 ** 2} MB", 413)
+        with self._lock:
+            self._expire()
+        upload_id = uuid.uuid4().hex
+        # Keep the extension, it tells the pipeline what kind of file it is
+        suffix = os.path.splitext(os.path.basename(filename))[1]
+        path = os.path.join(self.directory, f"{upload_id}{suffix}")
+        upload = {
+            'id': upload_id,
+            'status': 'receiving',
+            'filename': filename,
+            'path': path,
+            'size': size,
+            'chunk_size': self.chunk_size,
+            'total_chunks': -(-size // self.chunk_size),
+            'checksum': checksum.lower() if checksum else None,
+            'chunks': {},
+            'fields': fields or {},
+            'job_id': None,
+            'created_at': time.time(),
+        }
+        # Reserve the whole file so chunks can be written at their offsets in any order
+        with open(path, 'wb') as output:
+            output.truncate(size)
+        with self._lock:
+            self._uploads[upload['id']] = upload
+            self._save(upload)
+        logging.info(f"Started chunked upload {upload['id']} of {size} bytes in {upload['total_chunks']} chunks.")
+        return self.get(upload['id'])
+
+    def get(self, upload_id):
+        with self._lock:
+            upload = self._get(upload_id)
+            state = json.loads(json.dumps(upload))
+        state['received'] = sorted(int(index) for index in state.pop('chunks'))
+        return state
+
+    def put_chunk(self, upload_id, index, stream, checksum=None):
+        """Write chunk `index` from a file-like stream, checking its length and optional SHA-256."""
+        with self._lock:
+            upload = self._get(upload_id)
+            if upload['status'] == 'verifying':
+                raise ChunkedUploadError(f"Upload {upload_id} is being verified", 409)
+            if upload['status'] != 'receiving':
+                raise ChunkedUploadError(f"Upload {upload_id} is already complete", 409)
+            if not 0 <= index < upload['total_chunks']:
+                raise ChunkedUploadError(f"Chunk {index} is out of range")
+            expected = self._chunk_length(upload, index)
+            path = upload['path']
+
+        digest = hashlib.sha256()
+        written = 0
+        with open(path, 'r+b') as output:
+            output.seek(index * upload['chunk_size'])
+            while data := stream.read(READ_SIZE):
+                written += len(data)
+                # Never write past the chunk into the bytes of the next one
+                if written > expected:
+                    break
+                output.write(data)
+                digest.update(data)
+        if written != expected:
+            raise ChunkedUploadError(f"Chunk {index} has {written} bytes, expected {expected}")
+        digest = digest.hexdigest()
+        if checksum and checksum.lower() != digest:
+            raise ChunkedUploadError(f"Chunk {index} does not match its checksum")
+
+        with self._lock:
+            upload['chunks'][str(index)] = digest
+            self._save(upload)
+            return len(upload['chunks'])
+
+    def complete(self, upload_id, start_job, checksum=None):
+        """Verify the assembled file and hand it to start_job(state) once, returning the job ID.
+
+        The checksum from checksum_of_chunks may be declared here or when the upload was
+        created. Completing an upload again returns the job it already started, so a
+        client can safely retry a complete request whose response it never got.
+        """
+        with self._lock:
+            self._get(upload_id)
+            complete_lock = self._completing.setdefault(upload_id, threading.Lock())
+
+        # A retried request waits for the one in progress and then returns the job it started
+        with complete_lock:
+            with self._lock:
+                upload = self._get(upload_id)
+                if upload['job_id']:
+                    return upload['job_id']
+                missing = upload['total_chunks'] - len(upload['chunks'])
+                if missing:
+                    raise ChunkedUploadError(f"{missing} chunks are still missing", 409)
+                # Chunks sent while the file is hashed would change it under the check
+                upload['status'] = 'verifying'
+                self._save(upload)
+                state = json.loads(json.dumps(upload))
+            chunks = state.pop('chunks')
+            state['received'] = sorted(int(index) for index in chunks)
+
+            try:
+                job_id = self._verify_and_start(upload_id, state, chunks, start_job, checksum)
+            except Exception:
+                with self._lock:
+                    upload['status'] = 'receiving'
+                    self._save(upload)
+                raise
+            with self._lock:
+                upload.update(status='complete', job_id=job_id)
+                self._save(upload)
+            logging.info(f"Chunked upload {upload_id} assembled and verified, started job {job_id}.")
+            return job_id
+
+    def _verify_and_start(self, upload_id, state, chunks, start_job, checksum):
+        # Hash the file as it is on disk, so a chunk that was not fully written is caught here
+        digests = []
+        with open(state['path'], 'rb') as assembled:
+            for index in range(state['total_chunks']):
+                digest = hashlib.sha256()
+                remaining = self._chunk_length(state, index)
+                while remaining and (data := assembled.read(min(READ_SIZE, remaining))):
+                    digest.update(data)
+                    remaining -= len(data)
+                digests.append(digest.hexdigest())
+        corrupt = [index for index, digest in enumerate(digests) if chunks[str(index)] != digest]
+        if corrupt:
+            with self._lock:
+                stored = self._uploads[upload_id]['chunks']
+                for index in corrupt:
+                    del stored[str(index)]
+            raise ChunkedUploadError(f"Chunks {corrupt} were not stored correctly, please send them again", 409)
+        checksum = (checksum or state['checksum'] or '').lower()
+        if checksum and checksum_of_chunks(digests) != checksum:
+            raise ChunkedUploadError("The assembled file does not match its checksum", 422)
+        return start_job(state)
+
+    def release(self, upload_id):
+        """Delete the assembled file once its job is done with it.
+
+        The upload's state stays until it expires, so a retried complete still returns the job.
+        """
+        with self._lock:
+            upload = self._get(upload_id)
+            self._save(upload)
+        self._remove_files(upload['path'])
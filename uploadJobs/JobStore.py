@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+
+class UploadJobStore:
+    """Keeps the state and stage timings of upload jobs, with one JSON file per job so they survive a restart."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._jobs = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        for name in os.listdir(self.directory):
+            # Artifacts are stored next to the jobs as <job id>-<name>.json
+            if not name.endswith('.json') or '-' in name:
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r') as job_file:
+                    job = json.load(job_file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Skipping unreadable job file {name}: {str(e)}")
+                continue
+            # Jobs that were running when the server stopped cannot be resumed
+            if job['status'] in ('queued', 'running'):
+                job['status'] = 'failed'
+                job['error'] = 'Interrupted by a server restart.'
+                self._save(job)
+            self._jobs[job['id']] = job
+
+    def _write(self, name, data):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as output:
+            json.dump(data, output, indent=4)
+        path = os.path.join(self.directory, name)
+        os.replace(temp_path, path)
+        return path
+
+    def _save(self, job):
+        self._write(f"{job['id']}.json", job)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=time.time())
+            self._save(job)
+
+    def create(self, filename, recipients):
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'stage': 'queued',
+            'progress': 0,
+            'filename': filename,
+            'recipients': recipients,
+            'stages': {},
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now,
+        }
+        with self._lock:
+            self._jobs[job['id']] = job
+            self._save(job)
+        return job['id']
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def count(self, *statuses):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job['status'] in statuses)
+
+    def start_stage(self, job_id, stage):
+        with self._lock:
+            job = self._jobs[job_id]
+            job['stages'][stage] = {'started_at': time.time(), 'seconds': None}
+        self._update(job_id, status='running', stage=stage)
+
+    def finish_stage(self, job_id, stage):
+        with self._lock:
+            timing = self._jobs[job_id]['stages'][stage]
+            timing['seconds'] = round(time.time() - timing['started_at'], 3)
+        self._update(job_id)
+
+    def save_artifact(self, job_id, name, data):
+        """Store JSON data produced by a job as <job id>-<name>.json and return its path."""
+        return self._write(f"{job_id}-{name}.json", data)
+
+    def set_progress(self, job_id, progress):
+        self._update(job_id, progress=progress)
+
+    def complete(self, job_id, result):
+        self._update(job_id, status='completed', stage='completed', progress=100, result=result)
+
+    def fail(self, job_id, error):
+        self._update(job_id, status='failed', error=error)
@@ -0,0 +1,75 @@
+import threading
+import time
+
+# Share of the overall job progress taken by each stage, as (start, end) percentages
+STAGE_PROGRESS = {
+    'transcribe': (0, 70),
+    'analyze': (70, 90),
+    'pdf': (90, 95),
+    'email': (95, 100),
+}
+
+
+class ProgressThrottle:
+    """Turns per-stage progress into overall job progress and sends it at most once per min_interval.
+
+    Updates arriving faster than that are coalesced: only the latest one is kept, and it is
+    sent once min_interval has passed unless a newer update goes out first. A new stage, a
+    finished stage and the end of the job are always sent right away so the client never
+    misses a transition.
+    """
+
+    def __init__(self, send, min_interval=0.5):
+        self.send = send
+        self.min_interval = min_interval
+        self._last_sent = 0.0
+        self._last_stage = None
+        self._last_progress = -1
+        self._pending = None
+        self._timer = None
+        # Held while sending too, so a delayed update can never arrive after a later one
+        self._lock = threading.Lock()
+
+    def update(self, stage, stage_progress, status='running'):
+        start, end = STAGE_PROGRESS.get(stage, (0, 100))
+        stage_progress = max(0, min(100, int(stage_progress)))
+        progress = start + (end - start) * stage_progress // 100
+        payload = {'status': status, 'stage': stage, 'stage_progress': stage_progress, 'progress': progress}
+        now = time.monotonic()
+        with self._lock:
+            transition = stage != self._last_stage or status != 'running'
+            if not transition and progress == self._last_progress:
+                return
+            if not transition and stage_progress < 100 and now - self._last_sent < self.min_interval:
+                self._pending = payload
+                if self._timer is None:
+                    self._timer = threading.Timer(self.min_interval - (now - self._last_sent), self._flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            self._send(payload, now)
+
+    def cancel(self):
+        """Drop an update still waiting to be sent, once the job has ended."""
+        with self._lock:
+            self._clear_pending()
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            if self._pending is not None:
+                self._send(self._pending, time.monotonic())
+
+    def _send(self, payload, now):
+        # Called with the lock held
+        self._clear_pending()
+        self._last_sent = now
+        self._last_stage = payload['stage']
+        self._last_progress = payload['progress']
+        self.send(payload)
+
+    def _clear_pending(self):
+        self._pending = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,3 @@
+from .JobStore import UploadJobStore
+from .Progress import ProgressThrottle, STAGE_PROGRESS
+from .ChunkedUploads import ChunkedUploadStore, ChunkedUploadError, checksum_of_chunks